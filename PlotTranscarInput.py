@@ -19,7 +19,9 @@ def main():
     p.add_argument(
         "-d", "--dz", help="new z altitude grid spacing to interpolate to  (for tanh, (dzmin,dzmax))", type=float, nargs="+"
     )
-    p.add_argument("-m", "--newaltmethod", help="method of generating new altitude cell locations [linear, incr]", default="linear")
+    p.add_argument(
+        "-m", "--newaltmethod", help="method of generating new altitude cell locations [linear, incr, tanh]", default="linear"
+    )
     p = p.parse_args()
 
     msis = tr.readmsis(p.infn, p.outfn, p.dz, p.newaltmethod)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+reader benchmarks on synthetic output of several sizes.
+
+    pytest benchmarks
+
+Wall time is from pytest-benchmark.
+Peak Python/NumPy allocation [MB] and throughput [MB/s of file read] are in the "extra_info" of each result,
+e.g. pytest benchmarks --benchmark-json=bench.json
+"""
+import tracemalloc
+from pathlib import Path
+import pytest
+import xarray
+
+import transcarread as tr
+from transcarread import synthetic
+from transcarread.beams import loadbeams
+
+pytest.importorskip("pytest_benchmark")
+
+
+def measure(benchmark, func, *args, nbytes: int = 0, **kwargs):
+    """benchmark func and record peak allocation and throughput"""
+    tracemalloc.start()
+    func(*args, **kwargs)
+    benchmark.extra_info["peak_MB"] = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+
+    out = benchmark(func, *args, **kwargs)
+
+    if nbytes and benchmark.stats is not None:  # None with --benchmark-disable
+        benchmark.extra_info["file_MB"] = nbytes / 1e6
+        benchmark.extra_info["MB_per_s"] = nbytes / 1e6 / benchmark.stats.stats.mean
+
+    return out
+
+
+@pytest.mark.parametrize("n_t,nx", [(100, 286), (1000, 286), (100, 1000)])
+def test_read_tra(benchmark, tmp_path, n_t, nx):
+    fn = synthetic.make_tra(tmp_path / "dir.output/transcar_output", n_t, nx)
+
+    iono = measure(benchmark, tr.read_tra, tmp_path, nbytes=fn.stat().st_size)
+    assert iono.time.size == n_t
+
+
+@pytest.mark.parametrize("n_t,nx", [(1000, 286)])
+def test_read_tra_treq(benchmark, tmp_path, n_t, nx):
+    fn = synthetic.make_tra(tmp_path / "dir.output/transcar_output", n_t, nx)
+
+    measure(benchmark, tr.read_tra, tmp_path, "2013-03-31T09:08", nbytes=fn.stat().st_size // n_t)
+
+
+@pytest.mark.parametrize("n_t,nalt,nen", [(100, 123, 171), (1000, 123, 171), (1000, 123, 170), (100, 500, 171)])
+def test_readexcrates(benchmark, tmp_path, n_t, nalt, nen):
+    fn = synthetic.make_excrates(tmp_path / "emissions.dat", n_t, nalt, nen)
+
+    rates = measure(benchmark, tr.readexcrates, fn, nbytes=fn.stat().st_size)
+    assert rates.time.size == n_t
+
+
+@pytest.mark.parametrize("nx,ncol", [(286, 50), (286, 63), (2000, 63)])
+def test_readmsis(benchmark, tmp_path, nx, ncol):
+    fn = synthetic.make_msis(tmp_path / "90kmmaxpt123.dat", nx, ncol)
+
+    msis = measure(benchmark, tr.readmsis, fn, nbytes=fn.stat().st_size)
+    assert msis.alt_km.size == nx
+
+
+@pytest.mark.parametrize("method,dz", [("linear", [1.0]), ("incr", [0.05]), ("tanh", [1.0, 10.0])])
+def test_interpdat(benchmark, tmp_path, method, dz):
+    fn = synthetic.make_msis(tmp_path / "90kmmaxpt123.dat", 286)
+
+    msis = measure(benchmark, tr.readmsis, fn, None, dz, method, nbytes=fn.stat().st_size)
+    assert msis.attrs["hd"]["nx"] == msis.alt_km.size
+
+
+@pytest.mark.parametrize("n_t,nx", [(1, 286), (100, 286), (1000, 286)])
+def test_compplasmaparam(benchmark, tmp_path, n_t, nx):
+    synthetic.make_tra(tmp_path / "dir.output/transcar_output", n_t, nx)
+    iono = tr.read_tra(tmp_path)["iono"].loc[..., tr.PARAM]
+
+    pp = measure(benchmark, tr.compplasmaparam, iono, 13)
+    assert isinstance(pp, xarray.DataArray)
+
+
+@pytest.mark.parametrize("nbeam", [4, 16])
+@pytest.mark.parametrize("workers", [1, None])
+def test_loadbeams(benchmark, tmp_path, nbeam, workers):
+    dirs = synthetic.make_run(tmp_path, nbeam, n_t=60)
+    nbytes = sum((d / tr.KINFN).stat().st_size for d in dirs)
+
+    rates = measure(benchmark, loadbeams, tmp_path, workers=workers, nbytes=nbytes)
+    assert rates.beam_energy_eV.size == nbeam
+
+
+if __name__ == "__main__":
+    pytest.main([str(Path(__file__).parent)])
@@ -1,47 +1,45 @@
 #!/usr/bin/env python
 """
-Reads output of Transcar sim, yielding Incoherent Scatter Radar plasma parameters.
+Compares the output of two Transcar sims, e.g. a new build against a reference run.
+The runs are read one time step at a time, so the comparison takes little memory.
+Exit status is 1 if any value is out of tolerance, or if a time step is in only one run.
 
-    python transcar2isr.py tests/data/beam52
+    python diff_state.py ~/ref/beam52 ~/new/beam52 --rtol 1e-5
 
 """
-from pathlib import Path
-from matplotlib.pyplot import show
 from argparse import ArgumentParser
-from datetime import datetime
+import sys
+import xarray
 
-#
-import transcarread.plots as plots
-import transcarread as tr
+from transcarread.diff import diff_tra, diff_excrates
 
 
-def compute(path: Path, tReq: datetime, plot_params: list):
-    path = Path(path).expanduser().resolve()
-    # %% get sim parameters
-    datfn = path / "dir.input/DATCAR"
-    tctime = tr.readTranscarInput(datfn)
-    # %% load transcar output
-    iono = tr.read_tra(path, tReq)
+def compute(ref, new, params: list, excrates: bool, atol: float, rtol: float, ttol: float, failfast: bool) -> xarray.Dataset:
+    diff = diff_excrates if excrates else diff_tra
 
-    return iono, tctime
+    return diff(ref, new, params, atol=atol, rtol=rtol, ttol=ttol, failfast=failfast)
 
 
 def main():
-    p = ArgumentParser(description="reads dir.output/transcar_output")
+    p = ArgumentParser(description="compares dir.output/transcar_output of two runs")
     p.add_argument("ref", help="old reference path above dir.output/")
     p.add_argument("new", help="path above new dir.output/")
-    p.add_argument("--tReq", help="time to extract data at")
-    p.add_argument("-p", "--params", help="only plot these params", choices=["ne", "vi", "Ti", "Te"], nargs="+")
+    p.add_argument("-p", "--params", help="only compare these params", nargs="+")
+    p.add_argument("-e", "--excrates", help="compare dir.output/emissions.dat instead", action="store_true")
+    p.add_argument("--atol", help="absolute tolerance", type=float, default=0.0)
+    p.add_argument("--rtol", help="relative tolerance", type=float, default=1e-6)
+    p.add_argument("--ttol", help="time steps this many seconds apart are compared", type=float, default=0.0)
+    p.add_argument("-x", "--failfast", help="stop at first time step out of tolerance", action="store_true")
     p = p.parse_args()
 
-    dat1, t1 = compute(p.ref, p.tReq, p.params)
-    dat2, t2 = compute(p.new, p.tReq, p.params)
+    stats = compute(p.ref, p.new, p.params, p.excrates, p.atol, p.rtol, p.ttol, p.failfast)
 
-    diff = dat1-dat2
-    # %% do plot
-    plots.plot_isr(diff, p.new, t2, p.params)
+    print(stats.drop_vars(["atol", "rtol"]).to_dataframe().to_string())
+    print(f"{stats.compared} time steps compared, {stats.ref_only} only in {p.ref}, {stats.new_only} only in {p.new}")
+    if stats.stopped:
+        print(f"stopped at {stats.stopped}")
 
-    show()
+    sys.exit(not stats.ok)
 
 
 if __name__ == "__main__":
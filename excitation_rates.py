@@ -13,12 +13,14 @@ from matplotlib.pyplot import show
 from argparse import ArgumentParser
 
 from transcarread import ExcitationRates
+from transcarread.beams import loadbeams
 from transcarread.plots import plot_excitation_rates
 
 
 def main():
     p = ArgumentParser(description="Read Transcar excitation rates")
     p.add_argument("--emisfn", help="emissions.dat filename", default="dir.output/emissions.dat")
+    p.add_argument("-j", "--jobs", help="number of beams to read in parallel", type=int)
     p.add_argument("path", help="path where dir.output/emissions.dat is")
     p = p.parse_args()
 
@@ -27,16 +29,15 @@ def main():
         raise FileNotFoundError(path)
 
     if path.stem.startswith("beam"):  # specific beam
-        dirs = [path]
-    else:  # overall simulation
-        dirs = sorted(d for d in path.iterdir() if (d / p.emisfn).is_file())
-
-    if not dirs:
-        raise FileNotFoundError(f"did not find beams in {path}")
-    for d in dirs:
-        rates = ExcitationRates(d / p.emisfn)
-        rates.name = d.name[4:]
+        rates = ExcitationRates(path / p.emisfn)
+        rates.name = path.name[4:]
         plot_excitation_rates(rates)
+    else:  # overall simulation
+        beams = loadbeams(path, workers=p.jobs, kinfn=p.emisfn)["excitation"]
+        for e0 in beams.beam_energy_eV.values:
+            rates = beams.sel(beam_energy_eV=e0, drop=True)
+            rates.name = f"{e0:g}"
+            plot_excitation_rates(rates)
 
     show()
 
@@ -8,6 +8,7 @@ from pathlib import Path
 from argparse import ArgumentParser
 from dateutil.parser import parse
 import transcarread as tr
+from transcarread.beams import calcVERbeams
 
 from matplotlib.pyplot import figure, show
 
@@ -18,25 +19,25 @@ def main():
     p.add_argument("-t", "--treq", help="date/time  YYYY-MM-DDTHH-MM-SS", default="2013-03-31T09:00:30")
     p.add_argument("--filter", help="optical filter choices: bg3")
     p.add_argument("--tcopath", help="set path from which to read transcar output files", default="dir.output")
+    p.add_argument("-j", "--jobs", help="number of beams to read in parallel", type=int)
     p = p.parse_args()
 
     rodir = Path(p.path).expanduser().resolve()
     if not rodir.is_dir():
         raise FileNotFoundError(rodir)
 
-    dirs = sorted(d for d in rodir.glob("beam*") if d.is_dir())
-    if not dirs:
-        raise FileNotFoundError(f"no beams found in {rodir}")
-    for d in dirs:
-        sim = tr.SimpleSim(p.filter, p.tcopath, transcarutc=p.treq)
-        # %% run sim
-        rates = tr.calcVERtc(d, parse(p.treq), sim.transcarconfig)
+    sim = tr.SimpleSim(p.filter, p.tcopath, transcarutc=p.treq)
+    # %% run sim
+    beams = calcVERbeams(rodir, parse(p.treq), sim.transcarconfig, workers=p.jobs)
+
+    for e0 in beams.beam_energy_eV.values:
+        rates = beams.sel(beam_energy_eV=e0, drop=True).dropna("alt_km", how="all")
 
         ax = figure().gca()
         ax.semilogx(rates[:, :], rates.alt_km)
         ax.set_ylabel("altitude [km]")
         ax.set_xlabel("VER")
-        ax.set_title(d.name)
+        ax.set_title(f"beam{e0:g}")
 
     show()
 
@@ -1,15 +1,66 @@
 #!/usr/bin/env python
 from pathlib import Path
+import os
 import numpy as np
 import pytest
 from datetime import datetime
 from pytest import approx
+import xarray.testing
 
 import transcarread as tr
 
 #
 tdir = Path(__file__).parent
 infn = tdir / "data/beam52.7/dir.input/90kmmaxpt123.dat"
+tcofn = tdir / "data/beam52.7/dir.output/transcar_output"
+
+
+def multirecord(path: Path, n_t: int = 5) -> Path:
+    """write a transcar_output of n_t time steps one second apart, from the single-step test file"""
+    rec = np.fromfile(tcofn, np.float32, 126 + 286 * 63)
+    recs = np.tile(rec, (n_t, 1))
+    recs[:, 6], recs[:, 7] = np.divmod(np.arange(n_t), 60)  # minute, second
+    data = recs[:, 126:].reshape((n_t, 286, 63))
+    data[..., 1:] *= np.linspace(1, 2, n_t, dtype=np.float32)[:, None, None]  # leave altitude alone
+
+    fn = path / "dir.output/transcar_output"
+    fn.parent.mkdir(parents=True)
+    recs.tofile(fn)
+
+    return path
+
+
+def oldpp(d: xarray.DataArray, approx: int) -> np.ndarray:
+    """ne, vi, Ti, Te by the xarray arithmetic of compplasmaparam() before it was batched, the exact reference"""
+    ne = d.loc[..., ["n1", "n2", "n3", "n4", "n5", "n6", "n7"]].sum("isrparam").astype(float)
+    nm = d.loc[..., ["n4", "n5", "n6"]].sum("isrparam")
+
+    def ionsum(q):
+        return sum(d.loc[..., [n, v]].prod("isrparam") for n, v in zip(("n1", "n2", "n3"), q)) + nm * d.loc[..., q[3]]
+
+    vi = ionsum(("v1", "v2", "v3", "vm")) / ne
+    Ti = (1 / 3) * (ionsum(("t1p", "t2p", "t3p", "tmp")) / ne) + (2 / 3) * (ionsum(("t1t", "t2t", "t3t", "tmt")) / ne)
+    if approx == 13:
+        Te = (d.loc[..., "tep"] + 2 * d.loc[..., "tet"]).astype(float) / 3.0
+    else:
+        Te = d.loc[..., "tep"].astype(float)
+
+    return np.stack([ne.values, vi.values, Ti.values, Te.values], axis=-1)
+
+
+def multiemissions(path: Path, n_t: int = 5) -> Path:
+    """write an emissions.dat of n_t time steps one second apart, from the single-step test file"""
+    lines = (tdir / "data/beam52.7/dir.output/emissions.dat").read_text().splitlines(keepends=True)
+    head = lines[0].split()
+
+    fn = path / "dir.output/emissions.dat"
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    with fn.open("w") as f:
+        for i in range(n_t):
+            f.write(f"     {head[0]}   {float(head[1]) + i:.10f}        {head[2]}             {head[3]}         {head[4]}\n")
+            f.writelines(lines[1:])
+
+    return fn
 
 
 def test_readtra():
@@ -25,6 +76,274 @@ def test_readtra():
     assert iono["iono"].loc[..., "n1"][30] == approx(2.0969721e11)
     assert iono.attrs["chi"] == approx(110.40122986)
     assert iono["pp"].loc[..., "Ti"][53] == approx(1285.927001953125)
+    # per-parameter functions on DataArray, as before compplasmaparam()
+    d = iono["iono"]
+    nm = d.loc[:, ["n4", "n5", "n6"]].sum("isrparam")
+    pp = iono["pp"]
+    ref = oldpp(d.loc[..., tr.PARAM], 13)
+    np.testing.assert_array_equal(pp.loc[..., tr.ISRPARAM], ref)
+    for j, v in enumerate((tr.comp_ne(d), tr.comp_vi(d, nm, pp), tr.comp_Ti(d, nm, pp), tr.comp_Te(d, 13))):
+        assert v.dims == ("alt_km",)
+        np.testing.assert_array_equal(v, ref[:, j])
+
+
+def test_memmapread(tmp_path):
+    path = multirecord(tmp_path)
+    fn = path / "dir.output/transcar_output"
+
+    iono = tr.read_tra(path)
+    assert iono.time.size == 5
+    xarray.testing.assert_identical(iono, tr.loopread(fn, tr.readtraheader(fn)))
+
+
+def test_iter_tra(tmp_path):
+    path = multirecord(tmp_path)
+    iono = tr.read_tra(path)
+
+    for i, dat in enumerate(tr.iter_tra(path, start=1), start=1):
+        xarray.testing.assert_identical(dat, iono.isel(time=i))
+
+    head, alt, dat = next(tr.iter_tra(path, asarray=True))
+    assert head["htime"] == datetime(2013, 3, 31, 9)
+    assert dat == approx(iono["iono"][0].loc[:, tr.PARAM].values)
+
+
+def test_readtra_treq(tmp_path):
+    path = multirecord(tmp_path, 90)
+    iono = tr.read_tra(path)
+
+    for tReq in ("2013-03-31T08:00:00", "2013-03-31T09:00:41.4", "2013-03-31T09:00:41.5", "2013-03-31T10:00"):
+        i = tr.picktime(iono.time.values, tReq)[0]
+        xarray.testing.assert_identical(tr.read_tra(path, tReq), iono.isel(time=i))
+
+
+def test_follow(tmp_path):
+    from transcarread.follow import follow_tra, follow_excrates
+
+    path = multirecord(tmp_path / "full", 3)
+    raw = (path / "dir.output/transcar_output").read_bytes()
+    iono = tr.read_tra(path)
+
+    fn = tmp_path / "dir.output/transcar_output"
+    fn.parent.mkdir()
+    fn.write_bytes(raw[: len(raw) * 2 // 3 - 100])  # one and a partial time step
+
+    follow = follow_tra(tmp_path, interval=0.01, timeout=0.1)
+    xarray.testing.assert_equal(next(follow), iono.isel(time=0))
+    with fn.open("ab") as f:
+        f.write(raw[len(raw) * 2 // 3 - 100:])
+    assert [dat.time.values for dat in follow] == list(iono.time.values[1:])
+    # %% emissions.dat
+    rates = tr.readexcrates(multiemissions(tmp_path / "full", 3))
+    raw = (tmp_path / "full/dir.output/emissions.dat").read_bytes()
+    fn = tmp_path / "dir.output/emissions.dat"
+    fn.write_bytes(raw[: len(raw) // 2])
+
+    follow = follow_excrates(fn, interval=0.01, timeout=0.1)
+    xarray.testing.assert_identical(next(follow), rates.isel(time=0))
+    with fn.open("ab") as f:
+        f.write(raw[len(raw) // 2:])
+    for i, dat in enumerate(follow, start=1):
+        xarray.testing.assert_identical(dat, rates.isel(time=i))
+    assert i == 2
+    # both blocks of each time step ending in a short line
+    from transcarread import synthetic
+
+    raw = synthetic.make_excrates(tmp_path / "full/short.dat", 20, nalt=7, nen=3).read_bytes()
+    rates = tr.readexcrates(tmp_path / "full/short.dat")
+    fn = tmp_path / "short.dat"
+    fn.write_bytes(raw[: len(raw) // 3])
+
+    follow = follow_excrates(fn, interval=0.01, timeout=0.1)
+    xarray.testing.assert_identical(next(follow), rates.isel(time=0))
+    with fn.open("ab") as f:
+        f.write(raw[len(raw) // 3:])
+    for i, dat in enumerate(follow, start=1):
+        xarray.testing.assert_identical(dat, rates.isel(time=i))
+    assert i == 19
+
+
+def test_readexcrates_blocks(tmp_path, monkeypatch):
+    fn = multiemissions(tmp_path, 4)
+    rates = tr.readexcrates(fn)
+    assert rates.time.size == 4
+
+    monkeypatch.setattr(tr, "blocksize", 1000)  # numbers split across blocks
+    xarray.testing.assert_identical(tr.readexcrates(fn), rates)
+
+    fn.write_bytes(fn.read_bytes()[:-1000])  # partially written last time step
+    xarray.testing.assert_identical(tr.readexcrates(fn), rates.isel(time=slice(3)))
+
+
+def test_readexcrates_layout(tmp_path):
+    from transcarread import synthetic
+
+    # unlike the test file, the excitation (nalt=7) and precip (nen=3) blocks both end with a short line:
+    # one line per time step more than if the values ran on, so counting lines that way is off by a time step after 18
+    n_t, nalt, nen = 20, 7, 3
+    fn = synthetic.make_excrates(tmp_path / "emissions.dat", n_t, nalt, nen)
+    vals = np.array(fn.read_text().split(), dtype=float).reshape((n_t, -1))
+    ndat = nalt * tr.NdataCol
+
+    rates = tr.readexcrates(fn)
+    assert rates.time.size == n_t
+    assert (rates["excitation"].values == vals[:, 5: 5 + ndat].reshape((n_t, nalt, tr.NdataCol))[..., 1:]).all()
+    assert (rates["precip"].values.reshape((n_t, -1)) == vals[:, 5 + ndat:]).all()
+
+    index = tr.excratesindex(fn)
+    assert (index["time"] == rates.time.values).all()
+    assert index["end"][-1] == fn.stat().st_size
+    xarray.testing.assert_identical(tr.ExcitationRates(fn, rates.time.values[13]), rates["excitation"].isel(time=13))
+    xarray.testing.assert_identical(tr.readexcrecords(fn, 17, 20), rates.isel(time=slice(17, 20)))
+
+
+def test_excratesindex(tmp_path, monkeypatch):
+    fn = multiemissions(tmp_path, 6)
+    rates = tr.readexcrates(fn)
+
+    index = tr.excratesindex(fn)
+    assert (index["time"] == rates.time.values).all()
+    assert index["start"][1] == index["end"][0] == fn.stat().st_size // 6
+
+    xarray.testing.assert_identical(tr.readexcrecords(fn, 2, 4), rates.isel(time=slice(2, 4)))
+    for tReq in ("2013-03-31T09:00:44.4", "2013-03-31T09:00:44.5", "2013-04-01"):
+        i = tr.picktime(rates.time.values, tReq)[0]
+        xarray.testing.assert_identical(tr.ExcitationRates(fn, tReq), rates["excitation"].isel(time=i))
+
+    fn.write_bytes(fn.read_bytes()[: index["end"][0] - 10])  # not even the first time step is complete
+    assert tr.excratesindex(fn)["time"].size == tr.excratesindex(fn)["start"].size == 0
+    with pytest.raises(ValueError):
+        tr.readexcrates(fn)
+    fn.write_bytes(multiemissions(tmp_path / "one", 1).read_bytes().rstrip(b"\n"))  # nothing to compare its last line with
+    assert tr.excratesindex(fn)["time"].size == 0
+
+    # the index of a growing file is replaced, not added to
+    ncache = len(tr._excindex)
+    multiemissions(tmp_path, 7)
+    assert tr.excratesindex(fn)["time"].size == 7
+    assert len(tr._excindex) == ncache
+
+    # only the indexes of the files last used are kept
+    monkeypatch.setattr(tr.io, "NKEEP", 2)
+    fns = [multiemissions(tmp_path / str(i), 2) for i in range(3)]
+    for f in fns + fns[1:2]:
+        tr.excratesindex(f)
+    assert list(tr._excindex) == [str(f.resolve()) for f in (fns[2], fns[1])]
+
+
+def test_loadbeams(tmp_path):
+    from transcarread.beams import loadbeams
+
+    for e0 in ("beam10", "beam52.7", "beam7.5"):
+        multiemissions(tmp_path / e0, 3)
+
+    rates = loadbeams(tmp_path, workers=1)
+    assert rates.beam_energy_eV.values.tolist() == [7.5, 10, 52.7]
+    assert rates["excitation"].dims == ("beam_energy_eV", "time", "alt_km", "reaction")
+    beam = tr.readexcrates(tmp_path / "beam7.5/dir.output/emissions.dat")
+    xarray.testing.assert_identical(rates.isel(beam_energy_eV=0, drop=True), beam)
+
+    xarray.testing.assert_identical(loadbeams(tmp_path, workers=2), rates)
+    xarray.testing.assert_identical(loadbeams(tmp_path, "2013-03-31T09:00:43", workers=2), rates.isel(time=1))
+    # %% calcVERtc() of each beam
+    from transcarread import synthetic
+    from transcarread.beams import calcVERbeams
+
+    dirs = synthetic.make_run(tmp_path / "sim", nbeam=3, n_t=6, nx=40, nalt=21, nen=11)
+    tReq = datetime(2013, 3, 31, 9, 0, 3)
+    ver = calcVERbeams(tmp_path / "sim", tReq, "DATCAR", workers=2)
+    assert ver.dims == ("beam_energy_eV", "alt_km", "reaction")
+    for e0, d in zip(ver.beam_energy_eV.values, dirs):
+        xarray.testing.assert_identical(ver.sel(beam_energy_eV=e0, drop=True), tr.calcVERtc(d, tReq, "DATCAR"))
+    xarray.testing.assert_identical(calcVERbeams(tmp_path / "sim", tReq, "DATCAR", workers=1), ver)
+
+
+def test_cache(tmp_path):
+    pytest.importorskip("netCDF4")
+    from transcarread.cache import Cache
+
+    cache = Cache(tmp_path / "cache", usehash=True)
+    path = multirecord(tmp_path / "run", 3)
+    iono = tr.read_tra(path)
+
+    xarray.testing.assert_identical(cache.read_tra(path), iono)
+    assert len(list(cache.cachedir.glob("*.nc"))) == 1
+    xarray.testing.assert_identical(cache.read_tra(path), iono)  # from cache
+
+    msis = cache.readmsis(infn)
+    msis = cache.readmsis(infn)
+    ref = tr.readmsis(infn)
+    assert msis.attrs["hd"] == ref.attrs["hd"]
+    xarray.testing.assert_equal(msis, ref)
+
+    multirecord(tmp_path / "run2", 4)
+    (path / "dir.output/transcar_output").write_bytes((tmp_path / "run2/dir.output/transcar_output").read_bytes())
+    assert cache.read_tra(path).time.size == 4  # source changed
+
+    (cache.cachedir / "gone.nc").symlink_to(tmp_path / "missing.nc")  # deleted by another process while listed
+    (cache.cachedir / "other.nc.part").write_bytes(b"0" * 100)  # being written by another process
+    cache.maxbytes = 0
+    cache.evict()
+    assert sorted(f.name for f in cache.cachedir.iterdir()) == ["gone.nc", "other.nc.part"]
+
+
+def test_lazy(tmp_path):
+    pytest.importorskip("dask")
+
+    path = multirecord(tmp_path, 7)
+    iono = tr.read_tra(path, chunks=3)
+    assert iono["iono"].chunks[0] == (3, 3, 1)
+    xarray.testing.assert_identical(iono.compute(), tr.read_tra(path))
+
+    fn = multiemissions(tmp_path, 5)
+    rates = tr.readexcrates(fn, chunks=2)
+    assert rates["excitation"].chunks[0] == (2, 2, 1)
+    xarray.testing.assert_identical(rates.compute(), tr.readexcrates(fn))
+
+
+def test_synthetic(tmp_path):
+    from transcarread import synthetic
+
+    d = synthetic.make_run(tmp_path, nbeam=2, n_t=8, nx=100, nalt=41, nen=31)[0]
+
+    H = tr.readTranscarInput(d / "dir.input/DATCAR")
+    assert H["tstartPrecip"] < H["tendPrecip"]
+
+    iono = tr.read_tra(d)
+    assert iono["iono"].shape == (8, 100, 22 + 4)
+    assert (iono["pp"].loc[..., "ne"] > 0).all()
+
+    rates = tr.readexcrates(d / "dir.output/emissions.dat")
+    assert rates["excitation"].shape == (8, 41, 10)
+    assert rates["precip"].shape == (8, 31, 2)
+
+    msis = tr.readmsis(d / "dir.input/90kmmaxpt123.dat")
+    assert msis.alt_km.size == 100
+
+
+def test_writers(tmp_path):
+    from transcarread import writers
+
+    iono = tr.read_tra(multirecord(tmp_path / "src"))
+    sub = iono.isel(time=slice(1, None, 2)).sel(alt_km=slice(100, 400))
+
+    writers.write_tra(tmp_path / "src", tmp_path / "sel", sel=sub)
+    tlim = (sub.time[0].values, sub.time[-1].values)
+    writers.write_tra(tmp_path / "src", tmp_path / "lim", tlim=tlim, alt_range=(100, 400), step=2)
+    for d in ("sel", "lim"):
+        xarray.testing.assert_equal(tr.read_tra(tmp_path / d)["iono"].drop_attrs(), sub["iono"].drop_attrs())
+
+    kinfn = multiemissions(tmp_path, 4)
+    writers.write_excrates(kinfn, tmp_path / "all.dat")
+    assert (tmp_path / "all.dat").read_bytes() == kinfn.read_bytes()
+
+    rates = tr.readexcrates(kinfn).isel(time=[0, 3]).sel(alt_km=slice(100, 400))
+    writers.write_excrates(kinfn, tmp_path / "sub.dat", sel=rates)
+    xarray.testing.assert_equal(tr.readexcrates(tmp_path / "sub.dat"), rates)
+    # as Transcar writes it, the excitation block ends with a short line and precip starts on a new line
+    nval = rates.alt_km.size * tr.NdataCol
+    lines = (tmp_path / "sub.dat").read_text().splitlines()
+    assert len(lines[nval // tr.NumPerRow + 1].split()) == nval % tr.NumPerRow
 
 
 def test_readtranscar():
@@ -41,5 +360,339 @@ def test_readmsis():
     assert msis["msis"].loc[..., "no1d"][53] == approx(116101103616.0)
 
 
+def test_regrid(tmp_path):
+    from transcarread.regrid import newgrid, regrid
+
+    msis = tr.readmsis(infn)
+    z = msis.alt_km.values
+
+    assert newgrid(z, 2.0, "linear")[1] - z[0] == approx(2.0)
+    assert np.diff(newgrid(z, 0.5, "incr"))[:3] == approx([0.5, 1.0, 1.5])
+    assert newgrid(z, (1.0, 10.0), "tanh").size == z.size
+
+    ofn = tmp_path / "msis.dat"
+    lin = tr.readmsis(infn, ofn, [5.0], "linear")
+    assert lin.attrs["hd"]["nx"] == lin.alt_km.size == tr.readmsis(ofn).alt_km.size
+    assert lin["msis"].loc[:, "n2"].values == approx(np.interp(lin.alt_km, z, msis["msis"].loc[:, "n2"]), rel=1e-12)
+
+    iono = tr.read_tra(tdir / "data/beam52.7")
+    grids = [np.arange(100.0, 500.0, 5.0), np.arange(200.0, 300.0)]
+    coarse, fine = regrid(iono, grids)
+    assert coarse["iono"].shape == (1, grids[0].size, iono["iono"].shape[-1])
+    assert fine["pp"].loc[:, 250.0, "ne"] == approx(iono["pp"].interp(alt_km=250.0).loc[:, "ne"])
+
+
+def test_writemsisgrids(tmp_path):
+    specs = [([10.0], "linear", tmp_path / "lin.dat"), ([0.5], "incr", tmp_path / "incr.dat")]
+
+    assert tr.writemsisgrids(infn, specs, workers=2) == [ofn for _, _, ofn in specs]
+
+    for dz, method, ofn in specs:
+        tr.readmsis(infn, tmp_path / "ref.dat", dz, method)
+        assert ofn.read_bytes() == (tmp_path / "ref.dat").read_bytes()
+
+    with pytest.raises(ValueError):
+        tr.writemsisgrids(infn, [([1.0], "cubic", tmp_path / "bad.dat")])
+    assert not (tmp_path / "bad.dat").is_file()
+
+
+def test_instrument(tmp_path):
+    from transcarread.instrument import Instrument
+
+    calls = []
+    with Instrument(metrics=tmp_path / "metrics.prom", callback=lambda *a: calls.append(a)) as inst:
+        tr.read_tra(multirecord(tmp_path))
+        tr.readexcrates(multiemissions(tmp_path, 3))
+        tr.readmsis(infn)
+
+    res = inst.results
+    assert set(res) == {"read_tra", "readexcrates", "readmsis"}
+    assert res["read_tra"]["decode"]["records"] == 5
+    assert res["read_tra"]["decode"]["bytes"] == 5 * (126 + 286 * 63) * 4
+    assert res["readexcrates"]["parse"]["records"] == 3
+    assert res["readmsis"]["total"]["seconds"] >= res["readmsis"]["read"]["seconds"] > 0
+    assert res["readmsis"]["total"]["peak_bytes"] >= res["readmsis"]["plasmaparam"]["peak_bytes"] > 0
+    assert len(calls) == sum(r["calls"] for _, _, r in inst.rows())
+    assert 'transcarread_phase_records{function="read_tra",phase="decode"} 5' in (tmp_path / "metrics.prom").read_text()
+    # no recording outside the context
+    tr.readmsis(infn)
+    assert inst.results["readmsis"]["total"]["calls"] == 1
+
+
+def test_multitime(tmp_path):
+    path = multirecord(tmp_path)
+    kinfn = multiemissions(tmp_path)
+    full = tr.read_tra(path)
+    rates = tr.readexcrates(kinfn)
+
+    treq = full.time.values[0] + np.array([0, 1400, 2600, 2500, 4000], "timedelta64[ms]")
+
+    near = tr.read_tra(path, treq)
+    assert (near.time.values == treq).all()
+    assert (near.time_record.values == full.time.values[[0, 1, 3, 2, 4]]).all()
+    xarray.testing.assert_equal(near["iono"].drop_vars(["time", "time_record"]), full["iono"][[0, 1, 3, 2, 4]].drop_vars("time"))
+
+    lin = tr.read_tra(path, treq, method="linear")
+    np.testing.assert_allclose(lin["iono"].values, full["iono"].interp(time=treq).values, rtol=1e-6)
+
+    treq += rates.time.values[0] - full.time.values[0]
+    prev = tr.ExcitationRates(kinfn, treq, method="previous")
+    assert (prev.time_record.values == rates.time.values[[0, 1, 2, 2, 4]]).all()
+
+    lin = tr.readexcrates(kinfn, treq[2], method="linear")
+    np.testing.assert_allclose(lin["excitation"].values, rates["excitation"].interp(time=treq[2]).values)
+
+    with pytest.raises(ValueError):
+        tr.read_tra(path, [full.time.values[0] - np.timedelta64(1, "s")], method="linear")
+
+    # times out of order are searched through their sort order, with the same records as in order
+    shuffle = np.array([3, 0, 4, 1, 2])
+    for method in ("nearest", "previous", "linear"):
+        i0, i1, w = tr.searchtimes(rates.time.values, treq[1:], method)
+        j0, j1, v = tr.searchtimes(rates.time.values[shuffle], treq[1:], method)
+        assert (shuffle[j0] == i0).all() and (shuffle[j1] == i1).all() and (v == w).all()
+
+    # the times of a growing file are replaced, not added to
+    tcofn = path / "dir.output/transcar_output"
+    hd = tr.readtraheader(tcofn)
+    ncache = len(tr.io._tratimes)
+    raw = tcofn.read_bytes()
+    with tcofn.open("ab") as f:
+        f.write(raw[-hd["size_record"] * tr.d_bytes:])
+    assert tr.io.tratimes(tcofn, hd).size == 6
+    assert len(tr.io._tratimes) == ncache
+
+
+def test_pushdown(tmp_path):
+    path = multirecord(tmp_path)
+    kinfn = multiemissions(tmp_path)
+    ions = ["n1", "n2", "n3", "n4", "n5", "n6", "n7"]
+
+    full = tr.read_tra(path)
+    sub = tr.read_tra(path, alt_range=(100, 400), params=ions)
+    assert set(sub.isrparam.values) == set(ions + ["ne"])  # iono and pp share the coordinate
+    xarray.testing.assert_equal(sub["iono"].sel(isrparam=ions), full["iono"].sel(alt_km=slice(100, 400), isrparam=ions))
+    xarray.testing.assert_equal(sub["pp"].sel(isrparam="ne"), full["pp"].sel(alt_km=slice(100, 400), isrparam="ne"))
+
+    rates = tr.readexcrates(kinfn)
+    sub = tr.ExcitationRates(kinfn, alt_range=(100, 400), params=["p1ng", "no1d"])
+    xarray.testing.assert_equal(sub, rates["excitation"].sel(alt_km=slice(100, 400), reaction=["no1d", "p1ng"]))
+
+    hd = tr.readionoheader(infn, 126)[0]
+    msis, raw = tr.readinitconddat(hd, infn, (100, 200), ["n1", "po"])
+    ref = tr.readinitconddat(hd, infn)[0]
+    xarray.testing.assert_equal(msis, ref.sel(alt_km=slice(100, 200), isrparam=["n1", "po"]))
+    assert raw.shape == (msis.alt_km.size, hd["ncol"])
+
+    with pytest.raises(ValueError):
+        tr.read_tra(path, params=["nope"])
+
+
+def test_dtype(tmp_path):
+    path = multirecord(tmp_path)
+    kinfn = multiemissions(tmp_path)
+
+    ref = tr.read_tra(path)
+    assert ref["iono"].dtype == np.float32 and ref["pp"].dtype == np.float64
+    np.testing.assert_array_equal(ref["pp"].loc[..., tr.ISRPARAM], oldpp(ref["iono"].loc[..., tr.PARAM], 13))
+    for dat in (tr.read_tra(path, dtype=np.float32), tr.read_tra(path, chunks=2, dtype=np.float32).compute()):
+        assert dat["iono"].dtype == dat["pp"].dtype == np.float32
+        np.testing.assert_allclose(dat["pp"], ref["pp"], rtol=1e-6)
+
+    rates = tr.readexcrates(kinfn)
+    for sub in (
+        tr.readexcrates(kinfn, dtype=np.float32),
+        tr.readexcrates(kinfn, chunks=2, dtype=np.float32).compute(),
+        tr.readexcrates(kinfn, tReq=rates.time.values[1:3], dtype=np.float32),
+    ):
+        assert sub["excitation"].dtype == sub["precip"].dtype == np.float32
+        np.testing.assert_array_equal(sub.time, rates.time.sel(time=sub.time))
+        np.testing.assert_allclose(sub["excitation"], rates["excitation"].sel(time=sub.time), rtol=1e-6)
+
+    kinfn.write_bytes(kinfn.read_bytes().rstrip(b"\n"))  # the dtype must not change the time axis
+    for workers in (1, 2):
+        np.testing.assert_array_equal(tr.readexcrates(kinfn, dtype=np.float32, workers=workers).time, rates.time)
+
+
+def test_headers(tmp_path):
+    path = multirecord(tmp_path)
+    tcofn = path / "dir.output/transcar_output"
+    hd = tr.readtraheader(tcofn)
+    rec = np.memmap(tcofn, dtype=tr.ionorecord(hd), mode="r")
+
+    heads = tr.parseionoheaders(rec["head"])
+    for i, h in enumerate(rec["head"]):
+        ref = tr.parseionoheader(h)
+        assert heads["time"][i] == np.datetime64(ref["htime"])
+        assert heads["chi"][i] == ref["chi"] and heads["approx"][i] == ref["approx"]
+
+    bad = np.array(rec["head"])
+    bad[3, 3] = 13
+    with pytest.raises(ValueError):
+        tr.parseionoheaders(bad)
+
+    kinfn = multiemissions(tmp_path)
+    h = np.loadtxt(kinfn, max_rows=1)
+    assert tr.parseexcheaders(h)["time"][0] == np.datetime64(tr.parseheadtime(h))
+    with pytest.raises(ValueError):
+        tr.parseexcheaders(np.vstack((h, h * [1, 1, 1, 2, 1])))
+
+
+def test_convert(tmp_path, capsys):
+    pytest.importorskip("netCDF4")
+    from transcarread import cli, synthetic
+
+    dirs = synthetic.make_run(tmp_path / "sim", nbeam=2, n_t=4, nx=50, nalt=21, nen=11)
+    out = tmp_path / "nc"
+
+    assert cli.main(["convert", str(tmp_path / "sim"), "--out", str(out), "-j", "2"]) == 0
+    assert "converted 4 files" in capsys.readouterr().out
+
+    ofn = out / dirs[0].name / "transcar_output.nc"
+    with xarray.open_dataset(ofn) as f:
+        xarray.testing.assert_allclose(f["pp"], tr.read_tra(dirs[0])["pp"])
+        assert "tstartPrecip" in f.attrs["datcar"]
+    with xarray.open_dataset(out / dirs[1].name / "emissions.nc") as f:
+        xarray.testing.assert_equal(f["excitation"], tr.ExcitationRates(dirs[1] / tr.KINFN))
+
+    res = cli.convert(tmp_path / "sim", out, jobs=1)
+    assert [r["status"] for r in res] == ["skipped"] * 4
+
+    synthetic.make_tra(dirs[1] / "dir.output/transcar_output", 5, 50)  # source changed
+    res = cli.convert(tmp_path / "sim", out, jobs=1)
+    assert sorted(r["status"] for r in res) == ["converted"] + ["skipped"] * 3
+
+
+def test_diff(tmp_path):
+    from transcarread import diff, writers
+
+    ref = multirecord(tmp_path / "ref")
+    stats = diff.diff_tra(ref, ref)
+    assert stats.ok and stats.compared == 5 and (stats["max_abs"] == 0).all()
+
+    sub = writers.write_tra(ref, tmp_path / "sub", alt_range=(100, 400), step=2).parents[1]
+    stats = diff.diff_tra(ref, sub, params=["ne", "Te"])
+    assert (stats["nfail"] == 0).all() and stats.compared == 3 and stats.ref_only == 2
+    assert not stats.ok
+
+    new = multirecord(tmp_path / "new")
+    fn = new / "dir.output/transcar_output"
+    rec = np.memmap(fn, dtype=tr.ionorecord(tr.readtraheader(fn)), mode="r+")
+    rec["data"][2:, 100, 1] *= 1.01  # n1
+    rec.flush()
+    del rec
+
+    stats = diff.diff_tra(ref, new, rtol=dict.fromkeys(["n1", "ne", "vi", "Ti"], 0.1))
+    assert stats.ok
+    assert stats["max_rel"].sel(param="n1") == pytest.approx(0.01, rel=1e-3)
+
+    stats = diff.diff_tra(ref, new, failfast=True)
+    assert not stats.ok and stats.compared == 3 and stats["nfail"].sel(param="n1") == 1
+    assert stats["time_max_abs"].sel(param="n1") == np.datetime64(stats.stopped)
+
+    kinfn = multiemissions(tmp_path)
+    stats = diff.diff_excrates(kinfn, kinfn, params=["no1d"])
+    assert stats.ok and stats.param.values.tolist() == ["no1d"]
+
+
+def test_render(tmp_path):
+    pytest.importorskip("matplotlib")
+    from transcarread import render, synthetic
+
+    t = np.arange(1000).astype("datetime64[s]")
+    dat = np.random.default_rng(0).random((1000, 3))
+    dat[500, 1] = 10
+    dat[:, 2] = np.nan
+    tt, d = render.decimate(t, dat, 100)
+    assert tt.size == d.shape[0] == 100 and (np.diff(tt) > np.timedelta64(0)).all()
+    assert np.nanmax(d[:, 1]) == 10 and d[:, 0].min() == dat[:, 0].min() and np.isnan(d[:, 2]).all()
+    tt, d = render.decimate(t, dat, 100, "mean")
+    assert d.shape == (100, 3) and d[:, 0].mean() == pytest.approx(dat[:, 0].mean())
+
+    dirs = synthetic.make_run(tmp_path / "sim", nbeam=2, n_t=50, nx=40, nalt=21, nen=11)
+    pngs = render.render_beams(dirs, tmp_path / "png", ["ne", "Te"], verbose=True, jobs=2, size=(4, 3), dpi=50)
+    assert len(pngs) == 2 * (2 + 6) and all(f.read_bytes()[1:4] == b"PNG" for f in pngs)
+
+
+def test_verstore(tmp_path, monkeypatch):
+    pytest.importorskip("h5py")
+    from transcarread import synthetic, verstore
+
+    dirs = synthetic.make_run(tmp_path / "sim", nbeam=3, n_t=6, nx=40, nalt=21, nen=11)
+    sim = tr.SimpleSim("bg3", "dir.output")
+    sim.loadverfn = verstore.writever(tmp_path / "sim", tmp_path / "ver.h5", workers=2)
+
+    tReq = tr.readexcrates(dirs[1] / tr.KINFN).time.values[3].astype("datetime64[us]").item()
+    ref = tr.calcVERtc(dirs[1], tReq, sim.transcarconfig)
+    sim.loadver = True
+    xarray.testing.assert_identical(tr.calcVERtc(dirs[1], tReq, sim.transcarconfig, sim), ref)
+
+    ver = verstore.readver(sim.loadverfn, verstore.beamenergy(dirs[2]))
+    xarray.testing.assert_identical(ver, tr.ExcitationRates(dirs[2] / tr.KINFN))
+
+    monkeypatch.setattr(verstore, "SLABBYTES", 1)  # one time step at a time
+    verstore.writever(tmp_path / "sim", tmp_path / "slab.h5", workers=1)
+    xarray.testing.assert_identical(verstore.readver(tmp_path / "slab.h5", verstore.beamenergy(dirs[2])), ver)
+
+
+def test_catalog(tmp_path):
+    import shutil
+    from datetime import timedelta
+    from transcarread import synthetic
+    from transcarread.catalog import Catalog
+
+    dirs = synthetic.make_run(tmp_path / "sim", nbeam=3, n_t=6, nx=40, nalt=21, nen=11)
+    cat = Catalog(tmp_path / "catalog.sqlite")
+    assert cat.update(tmp_path / "sim", workers=2) == {"scanned": 3, "unchanged": 0, "removed": 0, "failed": 0}
+
+    entry = cat.get(dirs[0])
+    iono = tr.read_tra(dirs[0])
+    assert entry["nx"] == 40 and entry["n_t"] == 6
+    assert entry["ne_max"] == pytest.approx(float(iono["pp"].loc[..., "ne"].max()))
+    assert entry["datcar"]["latgeo_ini"] == pytest.approx(65.12)
+
+    t0 = datetime(2013, 3, 31, 9)
+    assert cat.query() == dirs
+    assert cat.query(energy=(20, 2e4)) == dirs[1:]
+    assert cat.query(time=t0 + timedelta(seconds=5)) == dirs
+    assert cat.query(precip=t0 + timedelta(seconds=10)) == []
+    assert cat.query(where="beam_energy_eV < ?", args=(20,)) == dirs[:1]
+
+    synthetic.make_tra(dirs[2] / "dir.output/transcar_output", 10, 40)
+    shutil.rmtree(dirs[0])
+    assert cat.update(tmp_path / "sim", workers=1) == {"scanned": 1, "unchanged": 1, "removed": 1, "failed": 0}
+    assert cat.get(dirs[2])["n_t"] == 10 and cat.get(dirs[0]) is None
+
+
+def test_parallel_excrates(tmp_path):
+    kinfn = multiemissions(tmp_path, n_t=11)
+
+    xarray.testing.assert_identical(tr.readexcrates(kinfn, workers=3), tr.readexcrates(kinfn))
+    xarray.testing.assert_identical(
+        tr.ExcitationRates(kinfn, dtype=np.float32, workers=2), tr.ExcitationRates(kinfn, dtype=np.float32)
+    )
+
+    from transcarread import synthetic
+    from transcarread.parallel import parexcstream
+
+    kinfn = synthetic.make_excrates(tmp_path / "short.dat", 20, nalt=7, nen=3)
+    xarray.testing.assert_identical(tr.readexcrates(kinfn, workers=3), tr.readexcrates(kinfn))
+
+    for fn in (multiemissions(tmp_path / "nonl", 6), synthetic.make_excrates(tmp_path / "nonl.dat", 6, nalt=7, nen=3)):
+        fn.write_bytes(fn.read_bytes().rstrip(b"\n"))  # last time step without its final newline
+        rates = tr.readexcrates(fn)
+        assert rates.time.size == tr.excratesindex(fn)["time"].size == 6
+        xarray.testing.assert_identical(tr.readexcrates(fn, workers=2), rates)
+
+        fn.write_bytes(fn.read_bytes()[:-3])  # last line still being written
+        assert tr.readexcrates(fn).time.size == tr.readexcrates(fn, workers=2).time.size == 5
+    dstream, n = parexcstream(kinfn, 2)
+    assert n == dstream.size
+    assert not list(kinfn.parent.glob("*.dstream"))
+    np.testing.assert_array_equal(parexcstream(kinfn, 2, tmpdir=tmp_path / "nonl")[0], dstream)
+    if os.name != "nt":
+        assert isinstance(dstream, np.memmap)  # the shared output itself, not a copy
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
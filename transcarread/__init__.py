@@ -1,14 +1,19 @@
 import logging
+import warnings
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime, timedelta
 import numpy as np
-from scipy.interpolate import interp1d
 import xarray
-from typing import Tuple, Union, List, IO, Any
+from typing import Tuple, Union, List, IO, Any, Dict, Iterator, Sequence
 
 #
-from .ztanh import setupz
-from .io import readTranscarInput, readionoheader, parseionoheader
+from .regrid import newgrid, regrid, regridarray, weights, interp
+from .instrument import instrumented, phase
+from .io import readTranscarInput, readionoheader, parseionoheader, parseionoheaders, ionorecord, tratimes, headnx
+from .io import recallindex, keepindex
 
 #
 nhead = 126  # a priori from transconvec_13
@@ -21,9 +26,18 @@ d_bytes = 4
 headbytes = 504
 
 toobig = 300  # beyond which number of altitude cells transcar will crash
+blocksize = 2 ** 24  # bytes of ASCII output converted to float at a time
 
 
 ISRPARAM = ["ne", "vi", "Ti", "Te"]
+_ions = ("n1", "n2", "n3", "n4", "n5", "n6", "n7")
+# ionosphere state needed by each of ISRPARAM
+PPINPUTS = {
+    "ne": _ions,
+    "vi": _ions + ("v1", "v2", "v3", "vm"),
+    "Ti": _ions + ("t1p", "t1t", "t2p", "t2t", "t3p", "t3t", "tmp", "tmt"),
+    "Te": ("tep", "tet"),
+}
 PARAM = [
     "n1",
     "n2",
@@ -49,6 +63,48 @@ PARAM = [
     "tet",
 ]
 KINFN = "dir.output/emissions.dat"
+# columns of MSIS initial conditions file, po1d, no1d, uo1d are present only for ncol > 60
+MSISPARAM = [
+    "n1",
+    "n2",
+    "n3",
+    "n4",
+    "n5",
+    "n6",
+    "v1",
+    "v2",
+    "v3",
+    "vm",
+    "ve",
+    "t1p",
+    "t1t",
+    "t2p",
+    "t2t",
+    "t3p",
+    "t3t",
+    "tmp",
+    "tmt",
+    "tep",
+    "tet",
+    "q1",
+    "q2",
+    "q3",
+    "qe",
+    "nno",
+    "uno",
+    "po",
+    "ph",
+    "pn",
+    "pn2",
+    "po2",
+    "heat",
+    "po1d",
+    "no1d",
+    "uo1d",
+    "n7",
+]
+REACTION = ["no1d", "no1s", "noii2p", "nn2a3", "po3p3p", "po3p5p", "p1ng", "pmein", "p2pg", "p1pg"]
+_excindex: "OrderedDict[str, Tuple[Tuple[int, int], Dict[str, np.ndarray]]]" = OrderedDict()  # index by path, with size, mtime
 
 
 def read_precinput(path: Path) -> np.ndarray:
@@ -71,10 +127,20 @@ def read_precinput(path: Path) -> np.ndarray:
     return np.loadtxt(path, delimiter=" ", skiprows=1, max_rows=34)
 
 
-def read_tra(path: Path, tReq: datetime = None) -> xarray.DataArray:
+@instrumented
+def read_tra(
+    path: Path,
+    tReq: datetime = None,
+    chunks: int = None,
+    method: str = "nearest",
+    alt_range: Sequence[float] = None,
+    params: Sequence[str] = None,
+    dtype: Any = None,
+) -> xarray.DataArray:
     """
     reads binary "transcar_output" file
     many more quantities exist in the binary file, these are the ones we use so far.
+    The file is memory-mapped and all time steps are sliced at once, see memmapread()
     requires: Matplotlib >= 1.4
 
     examples: test_readtra.py
@@ -82,7 +148,15 @@ def read_tra(path: Path, tReq: datetime = None) -> xarray.DataArray:
     Parameters
     ----------
     tcofn: path/filename of transcar_output file
-    tReq: optional, datetime at which to extract data from file (will still read whole file first)
+    tReq: optional, datetime at which to extract data from file.
+          Only the record headers and the nearest record are read.
+          A sequence of times gives a Dataset with these times, see taketimes().
+    chunks: optional, number of time steps per chunk of a lazy dask-backed Dataset,
+            for files larger than RAM. Each chunk is read when computed. Requires dask.
+    method: "nearest", "previous" or "linear" record(s) for tReq
+    alt_range: optional, (lowest, highest) altitude [km] to read
+    params: optional, names of PARAM to read. pp has only the quantities computable from these.
+    dtype: optional, e.g. np.float32 for iono and pp. None: iono as stored (float32), pp float64.
 
     variables:
     n_t: number of time steps in file
@@ -94,6 +168,22 @@ def read_tra(path: Path, tReq: datetime = None) -> xarray.DataArray:
     """
     tcofn = path / "dir.output/transcar_output"
 
+    with phase("header") as p:
+        hd = readtraheader(tcofn)
+        p["bytes"] += nhead * d_bytes
+    # %% read data based on header
+    if chunks is not None and tReq is None:
+        from .lazy import lazyread
+
+        iono = lazyread(tcofn, hd, chunks, alt_range, params, dtype)
+    else:
+        iono = memmapread(tcofn, hd, tReq, method, alt_range, params, dtype)
+
+    return iono
+
+
+def readtraheader(tcofn: Path) -> Dict[str, Any]:
+    """first header of transcar_output, with the record sizes needed to step through the file"""
     hd = readionoheader(tcofn, nhead)[0]
 
     hd["size_head"] = 2 * hd["ncol"]  # +2 by defn of transconvec_13
@@ -101,23 +191,125 @@ def read_tra(path: Path, tReq: datetime = None) -> xarray.DataArray:
     hd["size_record"] = hd["size_head"] + hd["size_data_record"]
 
     assert hd["size_head"] == nhead
-    # %% read data based on header
-    iono = loopread(tcofn, hd, tReq)
+
+    return hd
+
+
+def iter_tra(path: Path, asarray: bool = False, start: int = 0) -> Iterator[Any]:
+    """
+    yield one time step of transcar_output at a time, so memory use does not grow with file size
+
+    Parameters
+    ----------
+    path: directory above dir.output/transcar_output
+    asarray: instead of a Dataset as from data_tra(), yield (head, alt_km, iono) where
+             head is the dict of parseionoheader() and iono is nx x len(PARAM)
+    start: index of first time step to yield
+
+    The number of time steps is fixed when iteration starts.
+    """
+    tcofn = Path(path).expanduser() / "dir.output/transcar_output"
+
+    hd = readtraheader(tcofn)
+    n_t = tcofn.stat().st_size // hd["size_record"] // d_bytes
+
+    with tcofn.open("rb") as f:
+        f.seek(start * hd["size_record"] * d_bytes)
+        for _ in range(start, n_t):
+            if asarray:
+                yield readrecord(f, hd)
+            else:
+                yield data_tra(f, hd)
+
+
+@instrumented
+def memmapread(
+    tcofn: Path,
+    hd: dict,
+    tReq: datetime = None,
+    method: str = "nearest",
+    alt_range: Sequence[float] = None,
+    params: Sequence[str] = None,
+    dtype: Any = None,
+) -> xarray.Dataset:
+    """
+    vectorized equivalent of loopread():
+    map the file once as an array of fixed-size records and slice every time step in one step.
+    Only the altitude rows in alt_range are sliced.
+    """
+    tcoutput = Path(tcofn).expanduser()
+    n_t = tcoutput.stat().st_size // hd["size_record"] // d_bytes
+
+    rec = np.memmap(tcoutput, dtype=ionorecord(hd), mode="r", shape=(n_t,))
+    data = rec["data"][:, altslice(rec["data"][0, :, 0], alt_range)]
+    params = selectparams(params, PARAM)
+    # %% handle time request -- only the records needed are sliced from the map
+    if tReq is None:
+        iono = stack_tra(rec["head"], data, str(tcoutput), params, dtype)
+    elif manytimes(tReq) or method != "nearest":
+        iono = taketimes(
+            lambda i, r=rec, d=data: stack_tra(r["head"][i], d[i], str(tcoutput), params, dtype),
+            tratimes(tcoutput, hd),
+            tReq,
+            method,
+        )
+    else:
+        i = searchtime(tratimes(tcoutput, hd), tReq)
+        iono = stack_tra(rec["head"][i: i + 1], data[i: i + 1], str(tcoutput), params, dtype).isel(time=0)
+
+    del rec, data
 
     return iono
 
 
+def stack_tra(
+    head: np.ndarray, data: np.ndarray, filename: str, params: Sequence[str] = PARAM, dtype: Any = None
+) -> xarray.Dataset:
+    """
+    build the iono/pp Dataset from stacked records
+
+    head: n_t x size_head
+    data: n_t x nx x ncol
+    params: PARAM columns to take from data
+    dtype: of iono and pp. None: iono as data, pp float64
+    """
+    with phase("decode") as p:
+        heads = parseionoheaders(head)
+        approx = heads["approx"][0]
+        dextind = _dextind(approx)
+
+        iono = xarray.DataArray(
+            np.asarray(data[:, :, [dextind[PARAM.index(q)] for q in params]], dtype=dtype),
+            coords=[("time", heads["time"]), ("alt_km", np.array(data[0, :, 0])), ("isrparam", list(params))],
+            attrs={"filename": filename},
+        )
+        p["bytes"] += head.nbytes + data.nbytes
+        p["records"] += heads["time"].size
+
+    pp = compplasmaparam(iono, approx, dtype or float)
+
+    return xarray.Dataset({"iono": iono, "pp": pp}, attrs={"chi": heads["chi"][0]})
+
+
+@instrumented
 def loopread(tcofn: Path, hd: dict, tReq: datetime = None) -> xarray.DataArray:
 
     tcoutput = Path(tcofn).expanduser()
     n_t = tcoutput.stat().st_size // hd["size_record"] // d_bytes
+    # all record headers are decoded together, by a strided view of the file
+    with phase("decode") as p:
+        rec = np.memmap(tcoutput, dtype=ionorecord(hd), mode="r", shape=(n_t,))
+        heads = parseionoheaders(rec["head"])
+        del rec
+        p["records"] += n_t
 
     iono: xarray.DataArray = []
     with tcoutput.open("rb") as f:  # reset to beginning
-        for _ in range(n_t):
-            iono.append(data_tra(f, hd))
+        for i in range(n_t):
+            iono.append(data_tra(f, hd, {k: v[i] for k, v in heads.items()}))
 
-    iono = xarray.concat(iono, "time")
+    with phase("concat"):
+        iono = xarray.concat(iono, "time")
     # %% handle time request -- will return Dataframe if tReq, else returns Panel of all times
     if tReq is not None:  # have to qualify this since picktime default gives last time as fallback
         tUsedInd = picktime(iono.time.values, tReq)[0]
@@ -127,21 +319,30 @@ def loopread(tcofn: Path, hd: dict, tReq: datetime = None) -> xarray.DataArray:
     return iono
 
 
-def data_tra(f: IO[Any], hd: dict) -> xarray.DataArray:
+def readrecord(f: IO[Any], hd: dict, head: Dict[str, Any] = None) -> Tuple[Dict[str, Any], np.ndarray, np.ndarray]:
+    """
+    read one time step at the current file position
+
+    head: optional, this record of parseionoheaders(), else the header is parsed here
+    returns: header dict, altitude [km], nx x len(PARAM) data in the order of PARAM
+    """
     # %% parse header
     h = np.fromfile(f, np.float32, nhead)
-    head = parseionoheader(h)
+    if head is None:
+        head = parseionoheader(h)
     # %% read and index data
     data = np.fromfile(f, np.float32, hd["size_data_record"]).reshape((hd["nx"], hd["ncol"]), order="C")
 
-    dextind = tuple(range(1, 7)) + (49,) + tuple(range(7, 13))
-    if head["approx"] >= 13:
-        dextind += tuple(range(13, 22))
-    else:
-        dextind += (12, 13, 13, 14, 14, 15, 15, 16, 16)
-    # n7=49 if ncol>49 else None
+    return head, data[:, 0], data[:, _dextind(head["approx"])]
+
 
-    iono = xarray.DataArray(data[:, dextind], coords=[("alt_km", data[:, 0]), ("isrparam", PARAM)], attrs={"filename": f.name})
+def data_tra(f: IO[Any], hd: dict, head: Dict[str, Any] = None) -> xarray.DataArray:
+    with phase("read") as p:
+        head, alt, data = readrecord(f, hd, head)
+        p["bytes"] += hd["size_record"] * d_bytes
+        p["records"] += 1
+
+    iono = xarray.DataArray(data, coords=[("alt_km", alt), ("isrparam", PARAM)], attrs={"filename": f.name})
     # %% four ISR parameters
     """
     ion velocity from read_fluidmod.m
@@ -150,31 +351,94 @@ def data_tra(f: IO[Any], hd: dict) -> xarray.DataArray:
     """
     pp = compplasmaparam(iono, head["approx"])
     # %% output
-    iono = xarray.Dataset({"iono": iono, "pp": pp}, coords={"time": head["htime"]}, attrs={"chi": head["chi"]})
+    t = head["time"] if "time" in head else head["htime"]
+    iono = xarray.Dataset({"iono": iono, "pp": pp}, coords={"time": t}, attrs={"chi": head["chi"]})
 
     return iono
 
 
+def _dextind(approx: float) -> Tuple[int, ...]:
+    """transcar_output columns in the order of PARAM"""
+    dextind = tuple(range(1, 7)) + (49,) + tuple(range(7, 13))
+    if approx >= 13:
+        dextind += tuple(range(13, 22))
+    else:
+        dextind += (12, 13, 13, 14, 14, 15, 15, 16, 16)
+    # n7=49 if ncol>49 else None
+
+    return dextind
+
+
 # %% read iono
+@instrumented
 def readmsis(ifn: Path, ofn: Path = None, dz=None, newaltmethod: str = None):
     """reads MSIS model output that Transcar uses"""
 
     nhead = headbytes // d_bytes
 
-    hd, hdraw = readionoheader(ifn, nhead)
+    with phase("read") as p:
+        hd, hdraw = readionoheader(ifn, nhead)
+
+        msis, raw = readinitconddat(hd, ifn)  # index is altitude (km)
+        p["bytes"] += hdraw.nbytes + raw.nbytes
+        p["records"] += 1
 
-    msis, raw = readinitconddat(hd, ifn)  # index is altitude (km)
     pp = compplasmaparam(msis, hd["approx"])
 
     iono = xarray.Dataset({"msis": msis, "pp": pp}, attrs={"hd": hd})
 
-    msisint, rawinterp = interpdat(iono, dz, raw, newaltmethod)
+    with phase("interpolate"):
+        msisint, rawinterp = interpdat(iono, dz, raw, newaltmethod)
 
-    writeinterpunformat(msisint.attrs["hd"]["nx"], rawinterp, hdraw, ofn)
+    with phase("write"):
+        writeinterpunformat(msisint.attrs["hd"]["nx"], rawinterp, hdraw, ofn)
 
     return msisint
 
 
+def writemsisgrids(ifn: Path, specs: Sequence[Tuple[Any, str, Path]], workers: int = None) -> List[Path]:
+    """
+    write many altitude-regridded variants of MSIS initial conditions file ifn, e.g. for grid sensitivity studies.
+    ifn is read once, and the interpolation weights of all grids are computed together.
+    Each output file is preallocated and memory-mapped, and written in parallel threads.
+    Output is identical to readmsis(ifn, ofn, dz, newaltmethod) for each variant.
+
+    specs: (dz, newaltmethod, ofn) of each variant
+    workers: number of threads. None: Python default
+
+    returns: filenames written
+    """
+    nhead = headbytes // d_bytes
+
+    hd, hdraw = readionoheader(ifn, nhead)
+    msis, raw = readinitconddat(hd, ifn)
+    z = msis.alt_km.values
+    # %% all grids are checked before any file is written
+    grids = [newgrid(z, dz, newaltmethod) for dz, newaltmethod, _ in specs]
+    for g, (_, _, ofn) in zip(grids, specs):
+        if g.size > toobig:
+            logging.warning(f"{ofn}: Transcar may not accept altitude grids with more than about {toobig} elements.")
+
+    i, w = weights(z, np.concatenate(grids))
+    start = np.cumsum([0] + [g.size for g in grids])
+
+    def _write(j: int) -> Path:
+        ofn = Path(specs[j][2]).expanduser()
+        nx = grids[j].size
+        k = slice(start[j], start[j + 1])
+
+        out = np.memmap(ofn, np.float32, "w+", shape=(hdraw.size + nx * raw.shape[1],))
+        out[: hdraw.size] = headnx(hdraw.copy(), nx)  # as writeinterpunformat()
+        out[hdraw.size:].reshape((nx, raw.shape[1]))[:] = interp(raw, i[k], w[k])
+        out.flush()
+        del out
+
+        return ofn
+
+    with ThreadPoolExecutor(max_workers=workers) as exe:
+        return list(exe.map(_write, range(len(specs))))
+
+
 def getaltgrid(ifn: Path) -> xarray.DataArray:
     """
     Helper function for HiST-feasibility to quickly get transcar alt grid
@@ -186,62 +450,29 @@ def getaltgrid(ifn: Path) -> xarray.DataArray:
     return msis.alt_km
 
 
-def interpdat(md: xarray.DataArray, dz, raw: np.ndarray, newaltmethod: str = None) -> tuple:
-    """interpolate data to new altitude grid"""
+def interpdat(md: xarray.Dataset, dz, raw: np.ndarray, newaltmethod: str = None) -> tuple:
+    """
+    interpolate initial conditions, derived parameters and raw columns to new altitude grid,
+    each as one block, see regrid.py
+    """
     # %% was interpolation requested?
     if dz is None or newaltmethod is None:
         return md, raw
-    # %% interpolate initial conditions
-    malt = newaltmethod.lower()
-    if malt == "tanh":
-        z_new = setupz(md.shape[0], md.index[0], dz[0], dz[1])
-    elif malt == "linear":
-        print(f"interpolating to grid space {dz:.2f} km.")
-        z_new = np.arange(md.index[0], md.index[-1], dz[0], dtype=float)
-    elif malt == "incr":
-        """
-        in this case, dz is start spacing and  amount to increase step size for each element
-        The method used to implement this is inefficient, but it is a very small dataset.
-        """
-        z_new = [md.index[0]]
-        cdz = dz[0]
-        while (z_new[-1] + cdz) < md.index[-1]:
-            z_new.append(z_new[-1] + cdz)
-            cdz += dz[0]
-        z_new = np.asarray(z_new)
-    else:
-        logging.error(f"unknown interp method {newaltmethod}, returning unaltered values.")
+    # %% new altitude grid
+    z = md.alt_km.values
+    try:
+        z_new = newgrid(z, dz, newaltmethod)
+    except ValueError as e:
+        logging.error(f"{e}, returning unaltered values.")
         return md, raw
 
     if z_new.size > toobig:
         logging.warning(f"Transcar may not accept altitude grids with more than about {toobig} elements.")
-
-    # %% assemble output
-    mint = xarray.DataArray(
-        np.empty((z_new.size, md.shape[1])),
-        dims=["alt_km", "isrparam"],
-        coords={"alt_km": z_new, "isrparam": md.coords["isrparam"]},
-    )  # this is faster than list(md)
-    for m in md:
-        fint = interp1d(md.index, md[m], kind="linear", axis=0)
-        mint.loc[:, m] = fint(z_new)
-    # %% new header, only change to number of altitudes
-    hdint = md.attrs["hd"]
-    hdint["nx"] = z_new.size
+    # %% interpolate, new header only changes number of altitudes
+    iono = regrid(md, [z_new])[0]
+    iono.attrs = {**md.attrs, "hd": {**md.attrs["hd"], "nx": z_new.size}}
     # %% raw data, we'll write this to disk later
-    fint = interp1d(md.index, raw, kind="linear", axis=0)
-    rawint = fint(z_new)
-    # %% interpolate derived parameters
-    ppint = xarray.DataArray(
-        np.empty((z_new.size, md["pp"].shape[1])),
-        dims=["alt_km", "isrparam"],
-        coords={"alt_km": z_new, "isrparam": md.coords["isrparam"]},
-    )
-    for p in md["pp"]:
-        fint = interp1d(md["pp"].alt_km, md["pp"].loc[:, p], kind="linear", axis=0)
-        ppint.loc[:, p] = fint(z_new)
-
-    iono = xarray.Dataset({"md": mint, "pp": ppint}, attrs={"hd": hdint})
+    rawint = regridarray(raw, z, [z_new])[0]
 
     return iono, rawint
 
@@ -254,7 +485,7 @@ def writeinterpunformat(nx: int, rawi, hdraw, ofn: Path = None):
 
     ofn = Path(ofn).expanduser()
     # update header with new number of altitudes due to interpolation
-    hdraw[0] = nx
+    headnx(hdraw, nx)
 
     print("writing", ofn)
     with ofn.open("wb") as f:
@@ -262,8 +493,17 @@ def writeinterpunformat(nx: int, rawi, hdraw, ofn: Path = None):
         rawi.astype(np.float32).tofile(f, "", "%f32")
 
 
-def readinitconddat(hd: dict, fn: Path) -> Tuple[xarray.DataArray, np.ndarray]:
-    """Reads initial conditions for Transcar from binary file"""
+def readinitconddat(
+    hd: dict, fn: Path, alt_range: Sequence[float] = None, params: Sequence[str] = None
+) -> Tuple[xarray.DataArray, np.ndarray]:
+    """
+    Reads initial conditions for Transcar from binary file
+
+    alt_range: optional, (lowest, highest) altitude [km] to read
+    params: optional, names of MSISPARAM to read
+
+    returns: msis, and all columns of the rows read
+    """
     fn = Path(fn).expanduser()
     nx = hd["nx"]
     ncol = hd["ncol"]
@@ -275,60 +515,26 @@ def readinitconddat(hd: dict, fn: Path) -> Tuple[xarray.DataArray, np.ndarray]:
     else:
         dextind = tuple(range(1, 13)) + (12, 13, 13, 14, 14, 15, 15, 16, 16) + tuple(range(17, 29))
 
+    names = MSISPARAM[:33]
     if ncol > 60:
         dextind += (60, 61, 62)
+        names += MSISPARAM[33:36]
 
     dextind += (49,)  # as in output
+    names += MSISPARAM[-1:]
 
-    with fn.open("rb") as f:  # python2 requires r first
-        ipos = 2 * ncol * d_bytes
-        f.seek(ipos, 0)
-        rawall = np.fromfile(f, np.float32, nx * ncol).reshape((nx, ncol), order="C")  # yes order='C'!
+    params = selectparams(params, names)
+    # yes order='C'!
+    raw = np.memmap(fn, np.float32, "r", offset=2 * ncol * d_bytes, shape=(nx, ncol), order="C")
+    rawall = np.array(raw[altslice(raw[:, 0], alt_range)])
+    del raw
 
     msis = xarray.DataArray(
-        rawall[:, dextind],
+        rawall[:, [dextind[names.index(q)] for q in params]],
         dims=["alt_km", "isrparam"],
         coords={
             "alt_km": rawall[:, 0],
-            "isrparam": [
-                "n1",
-                "n2",
-                "n3",
-                "n4",
-                "n5",
-                "n6",
-                "v1",
-                "v2",
-                "v3",
-                "vm",
-                "ve",
-                "t1p",
-                "t1t",
-                "t2p",
-                "t2t",
-                "t3p",
-                "t3t",
-                "tmp",
-                "tmt",
-                "tep",
-                "tet",
-                "q1",
-                "q2",
-                "q3",
-                "qe",
-                "nno",
-                "uno",
-                "po",
-                "ph",
-                "pn",
-                "pn2",
-                "po2",
-                "heat",
-                "po1d",
-                "no1d",
-                "uo1d",
-                "n7",
-            ],
+            "isrparam": params,
         },
         attrs={"filename": fn},
     )
@@ -337,7 +543,7 @@ def readinitconddat(hd: dict, fn: Path) -> Tuple[xarray.DataArray, np.ndarray]:
 
 
 # %% read transcar
-def calcVERtc(datadir: Path, tReq: datetime, config_fn: Path):
+def calcVERtc(datadir: Path, tReq: datetime, config_fn: Path, sim: "SimpleSim" = None):
     """
     calcVERtc is the function called by "hist-feasibility" to get Transcar modeled VER/flux
 
@@ -362,6 +568,8 @@ def calcVERtc(datadir: Path, tReq: datetime, config_fn: Path):
     Plambda row: wavelength col: altitude
     for each energy bin, we take Plambda through the EMCCD window and optional BG3 filter,
     yielding Peigen, a ver eigenprofile p(z,E) for that particular energy
+
+    sim: optional, if sim.loadver the rates are read from the store sim.loadverfn made by verstore.writever()
     """
     # %% get beam directory
     beamdir = Path(datadir)
@@ -376,16 +584,136 @@ def calcVERtc(datadir: Path, tReq: datetime, config_fn: Path):
             logging.error(f"your requested time {tReq} is outside the precipitation time")
             tReq = tctime["tendPrecip"]
             logging.warning(f"falling back to using the end simulation time: {tReq}")
-    # %% convert transcar output
-    rates = ExcitationRates(beamdir / KINFN)
+    if sim is not None and sim.loadver:
+        from .verstore import readver
+        from .beams import beamenergy
 
-    tReqInd, tUsed = picktime(rates.time.values, tReq)
-
-    rates = rates[tReqInd, ...]
+        return readver(sim.loadverfn, beamenergy(beamdir), tReq)
+    # %% convert transcar output -- only the time step nearest tReq is parsed
+    rates = ExcitationRates(beamdir / KINFN, tReq)
 
     return rates
 
 
+def selectparams(params: Sequence[str], names: Sequence[str]) -> List[str]:
+    """params in the order of names, all of names if params is None"""
+    if params is None:
+        return list(names)
+
+    unknown = set(params) - set(names)
+    if unknown:
+        raise ValueError(f"unknown parameters {sorted(unknown)}, choose from {names}")
+
+    return [n for n in names if n in params]
+
+
+def altslice(alt: np.ndarray, alt_range: Sequence[float] = None) -> slice:
+    """rows of increasing altitude grid alt [km] within alt_range (lowest, highest), inclusive"""
+    if alt_range is None:
+        return slice(None)
+
+    i = np.flatnonzero((alt >= alt_range[0]) & (alt <= alt_range[1]))
+    if i.size == 0:
+        raise ValueError(f"no altitudes within {alt_range} km")
+
+    return slice(i[0], i[-1] + 1)
+
+
+def searchtime(tTC: np.ndarray, tReq: datetime) -> int:
+    """
+    index of time nearest tReq, by binary search of sorted tTC.
+    Same result as picktime(), which is used if tTC is not sorted.
+    """
+    tReq = np.datetime64(tReq)
+
+    if (np.diff(tTC) < np.timedelta64(0)).any():
+        return picktime(tTC, tReq)[0]
+
+    i = np.searchsorted(tTC, tReq)
+    if i == tTC.size or (i > 0 and tReq - tTC[i - 1] <= tTC[i] - tReq):
+        i -= 1
+
+    return int(i)
+
+
+def searchtimes(tTC: np.ndarray, tReq, method: str = "nearest") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    records of each of the times tReq, by one binary search of tTC
+
+    method:
+    nearest: record nearest in time, the earlier one if equally near, as searchtime()
+    previous: last record at or before each time
+    linear: records before and after each time, which must be within tTC
+
+    returns: i0, i1, w. The value at tReq is (1 - w) * record i0 + w * record i1
+    """
+    tTC = np.asarray(tTC)
+    tReq = np.atleast_1d(np.asarray(tReq, dtype="datetime64[us]"))
+    # unsorted times are searched through their sort order, times in order as Transcar writes them are searched as is
+    order = None if (tTC[1:] >= tTC[:-1]).all() else np.argsort(tTC, kind="stable")
+    t = tTC if order is None else tTC[order]
+
+    i = np.searchsorted(t, tReq, side="right") - 1  # last at or before tReq, -1 if none
+    if method == "nearest":
+        i = np.clip(i, 0, t.size - 1)
+        after = np.minimum(i + 1, t.size - 1)
+        i = np.where(np.abs(t[after] - tReq) < np.abs(tReq - t[i]), after, i)
+        w = np.zeros(tReq.size)
+        i1 = i
+    elif method == "previous":
+        if (i < 0).any():
+            raise ValueError(f"no record at or before {tReq[i < 0][0]}, first is {t[0]}")
+        w = np.zeros(tReq.size)
+        i1 = i
+    elif method == "linear":
+        if (tReq < t[0]).any() or (tReq > t[-1]).any():
+            raise ValueError(f"requested times must be within {t[0]} .. {t[-1]}")
+        i = np.clip(i, 0, max(t.size - 2, 0))
+        i1 = np.minimum(i + 1, t.size - 1)
+        dt = (t[i1] - t[i]).astype(float)
+        w = np.divide((tReq - t[i]).astype(float), dt, out=np.zeros(tReq.size), where=dt > 0)
+    else:
+        raise ValueError(f"unknown time method {method}, choose nearest, previous or linear")
+
+    if order is None:
+        return i, i1, w
+    return order[i], order[i1], w
+
+
+def manytimes(tReq: Any) -> bool:
+    """is tReq a sequence of times rather than one time"""
+    return np.ndim(tReq) > 0
+
+
+def taketimes(read, tTC: np.ndarray, tReq, method: str = "nearest") -> xarray.Dataset:
+    """
+    Dataset at each of the times tReq, reading each record needed only once
+
+    read: function of sorted unique record indices, returning the Dataset of those records
+    tTC: time of each record
+    returns: Dataset with time coordinate tReq, without time dimension if tReq is a single time.
+             For nearest and previous, coordinate "time_record" is the time of the record used.
+    """
+    i0, i1, w = searchtimes(tTC, tReq, method)
+
+    rec, inv = np.unique(np.concatenate((i0, i1)), return_inverse=True)
+    data = read(rec)
+    t = np.atleast_1d(np.asarray(tReq, dtype="datetime64[ns]"))
+
+    out = data.isel(time=inv[: i0.size]).assign_coords(time=t)
+    if method == "linear":
+        after = data.isel(time=inv[i0.size:]).assign_coords(time=t)
+        wt = xarray.DataArray(w, dims="time", coords={"time": t})
+        with xarray.set_options(keep_attrs=True):
+            out = out + wt * (after - out)
+        for k in out.data_vars:
+            out[k] = out[k].astype(data[k].dtype)
+    else:
+        out = out.assign_coords(time_record=("time", np.asarray(tTC)[i0].astype("datetime64[ns]")))
+
+    return out if manytimes(tReq) else out.isel(time=0)
+
+
 def picktime(tTC, tReq):
 
     if tReq is None:
@@ -444,79 +772,155 @@ class SimpleSim:
 # %% ISR
 
 
-def compplasmaparam(iono: xarray.DataArray, approx: int) -> xarray.DataArray:
+def compplasmaparam(iono: xarray.DataArray, approx: int, dtype: Any = float) -> xarray.DataArray:
+    """
+    ISR plasma parameters ne, vi, Ti, Te from ionosphere state.
+    Computed in one batch over any leading dims:
+    (alt_km,) for one time step or (time, alt_km) for a whole file.
+    Only the parameters whose inputs are all in iono are computed, see PPINPUTS.
+    dtype: of pp, e.g. np.float32 to match iono, see plasmaparam()
+    """
     assert isinstance(iono, xarray.DataArray)
+    assert iono.dims[-1] == "isrparam"
 
-    pp = xarray.DataArray(
-        np.empty((iono.shape[0], 4)),
-        coords=[("alt_km", iono.alt_km), ("isrparam", ["ne", "vi", "Ti", "Te"])],
-        attrs={"filename": iono.attrs["filename"]},
-    )
-
-    nm = iono.loc[:, ["n4", "n5", "n6"]].sum(dim="isrparam")
+    which = ppavailable(iono.isrparam.values)
 
-    pp.loc[:, "ne"] = comp_ne(iono)
-    #    pp.sel(isrparam='ne') = comp_ne(iono) # doesn't work for assign?
-    pp.loc[:, "vi"] = comp_vi(iono, nm, pp)
-    pp.loc[:, "Ti"] = comp_Ti(iono, nm, pp)
-    pp.loc[:, "Te"] = comp_Te(iono, approx)
+    with phase("plasmaparam") as p:
+        pp = xarray.DataArray(
+            plasmaparam(iono.values, ppindex(iono.isrparam.values), approx, which, dtype),
+            coords=[(d, iono[d].values) for d in iono.dims[:-1]] + [("isrparam", which)],
+            attrs={"filename": iono.attrs["filename"]},
+        )
+        p["records"] += int(np.prod(iono.shape[:-2]))
 
     return pp
 
 
-def comp_ne(d: xarray.DataArray) -> xarray.DataArray:
-    """compute electron density vs. altitude"""
-    return d.loc[:, ["n1", "n2", "n3", "n4", "n5", "n6", "n7"]].sum("isrparam")
+def ppavailable(params: Sequence[str]) -> List[str]:
+    """ISRPARAM computable from params"""
+    return [q for q in ISRPARAM if set(PPINPUTS[q]) <= set(params)]
 
 
-def comp_vi(d: xarray.DataArray, nm: xarray.DataArray, pp: xarray.DataArray) -> xarray.DataArray:
-    """compute ion velocity vs. altitude"""
-    return (
-        d.loc[:, ["n1", "v1"]].prod("isrparam")
-        + d.loc[:, ["n2", "v2"]].prod("isrparam")
-        + d.loc[:, ["n3", "v3"]].prod("isrparam")
-        + nm * d.loc[:, "vm"]
-    ) / pp.loc[:, "ne"]
+def ppindex(params: List[str]) -> Dict[str, int]:
+    """integer column index of each parameter, so the plasma parameters are computed by position"""
+    return {p: i for i, p in enumerate(params)}
 
 
-def comp_Ti(d: xarray.DataArray, nm: xarray.DataArray, pp: xarray.DataArray) -> xarray.DataArray:
+def plasmaparam(
+    d: np.ndarray, ind: Dict[str, int], approx: int, which: Sequence[str] = ISRPARAM, dtype: Any = float
+) -> np.ndarray:
     """
-    Compute ion temperature
-    Refs: transconvec_13.op.f  read_fluidmod.m, data_tra.m
+    d: (..., param) ionosphere state, columns located by ind
+    which: ISRPARAM to compute
+    dtype: of output
+    returns: (..., len(which)) e.g. ne, vi, Ti, Te
+
+    NaN are skipped by the sums over species, as xarray .sum() / .prod() do.
+    With the default float64 output, the sums are in the dtype of d and divided by ne as stored in the output,
+    as they always were, so the values are unchanged.
+    With a narrower dtype, densities and density-weighted sums are accumulated in float64 and only the result is cast,
+    as n * v and n * T summed in float32 lose precision.
     """
+    pp = np.empty(d.shape[:-1] + (len(which),), dtype)
+    acc = None if np.dtype(dtype) == np.float64 else float
+
+    if {"ne", "vi", "Ti"} & set(which):
+        ne = _comp_ne(d, ind, acc)
+        if acc is None:
+            ne = ne.astype(dtype)
+    if {"vi", "Ti"} & set(which):
+        nm = np.nansum(d[..., [ind["n4"], ind["n5"], ind["n6"]]], axis=-1, dtype=acc)
+
+    for j, q in enumerate(which):
+        if q == "ne":
+            pp[..., j] = ne
+        elif q == "vi":
+            pp[..., j] = _comp_vi(d, ind, nm, ne, acc)
+        elif q == "Ti":
+            pp[..., j] = _comp_Ti(d, ind, nm, ne, acc)
+        elif q == "Te":
+            pp[..., j] = _comp_Te(d, ind, approx)
 
-    Tipar = (
-        d.loc[:, ["n1", "t1p"]].prod("isrparam")
-        + d.loc[:, ["n2", "t2p"]].prod("isrparam")
-        + d.loc[:, ["n3", "t3p"]].prod("isrparam")
-        + nm * d.loc[:, "tmp"]
-    ) / pp.loc[:, "ne"]
+    return pp
 
-    Tiperp = (
-        d.loc[:, ["n1", "t1t"]].prod("isrparam")
-        + d.loc[:, ["n2", "t2t"]].prod("isrparam")
-        + d.loc[:, ["n3", "t3t"]].prod("isrparam")
-        + nm * d.loc[:, "tmt"]
-    ) / pp.loc[:, "ne"]
+
+def _ionsum(d: np.ndarray, ind: Dict[str, int], nm: np.ndarray, q: Tuple[str, str, str, str], acc: Any = None) -> np.ndarray:
+    """n1*q1 + n2*q2 + n3*q3 + nm*qm, accumulated in dtype acc, None: dtype of d"""
+    return (
+        np.nanprod(d[..., [ind["n1"], ind[q[0]]]], axis=-1, dtype=acc)
+        + np.nanprod(d[..., [ind["n2"], ind[q[1]]]], axis=-1, dtype=acc)
+        + np.nanprod(d[..., [ind["n3"], ind[q[2]]]], axis=-1, dtype=acc)
+        + nm * d[..., ind[q[3]]]
+    )
+
+
+def _comp_ne(d: np.ndarray, ind: Dict[str, int], acc: Any = None) -> np.ndarray:
+    return np.nansum(d[..., [ind[n] for n in ("n1", "n2", "n3", "n4", "n5", "n6", "n7")]], axis=-1, dtype=acc)
+
+
+def _comp_vi(d: np.ndarray, ind: Dict[str, int], nm: np.ndarray, ne: np.ndarray, acc: Any = None) -> np.ndarray:
+    return _ionsum(d, ind, nm, ("v1", "v2", "v3", "vm"), acc) / ne
+
+
+def _comp_Ti(d: np.ndarray, ind: Dict[str, int], nm: np.ndarray, ne: np.ndarray, acc: Any = None) -> np.ndarray:
+    Tipar = _ionsum(d, ind, nm, ("t1p", "t2p", "t3p", "tmp"), acc) / ne
+
+    Tiperp = _ionsum(d, ind, nm, ("t1t", "t2t", "t3t", "tmt"), acc) / ne
     # return (n1*t1 + n2*t2 + n3*t3 +nm*tm)/(n1 +n2 +n3 +nm)
     Ti = (1 / 3) * Tipar + (2 / 3) * Tiperp
 
     return Ti
 
 
-def comp_Te(d: xarray.DataArray, approx: int) -> xarray.DataArray:
+def _comp_Te(d: np.ndarray, ind: Dict[str, int], approx: int) -> np.ndarray:
     if int(approx) == 13:
-        Te = (d.loc[:, "tep"] + 2 * d.loc[:, "tet"]).astype(float) / 3.0
+        Te = (d[..., ind["tep"]] + 2 * d[..., ind["tet"]]).astype(float) / 3.0
     else:
-        Te = d.loc[:, "tep"].astype(float)
+        Te = d[..., ind["tep"]].astype(float)
 
     return Te
 
 
+def _ppcoords(d: xarray.DataArray, v: np.ndarray) -> xarray.DataArray:
+    """v computed from d, with the coordinates of d but isrparam"""
+    return d.isel(isrparam=0, drop=True).copy(data=v)
+
+
+def comp_ne(d: xarray.DataArray) -> xarray.DataArray:
+    """compute electron density vs. altitude"""
+    return _ppcoords(d, _comp_ne(d.values, ppindex(d.isrparam.values)))
+
+
+def comp_vi(d: xarray.DataArray, nm: xarray.DataArray, pp: xarray.DataArray) -> xarray.DataArray:
+    """compute ion velocity vs. altitude"""
+    return _ppcoords(d, _comp_vi(d.values, ppindex(d.isrparam.values), nm.values, pp.loc[..., "ne"].values))
+
+
+def comp_Ti(d: xarray.DataArray, nm: xarray.DataArray, pp: xarray.DataArray) -> xarray.DataArray:
+    """
+    Compute ion temperature
+    Refs: transconvec_13.op.f  read_fluidmod.m, data_tra.m
+    """
+    return _ppcoords(d, _comp_Ti(d.values, ppindex(d.isrparam.values), nm.values, pp.loc[..., "ne"].values))
+
+
+def comp_Te(d: xarray.DataArray, approx: int) -> xarray.DataArray:
+    return _ppcoords(d, _comp_Te(d.values, ppindex(d.isrparam.values), approx))
+
+
 # %%
 
 
-def ExcitationRates(kinfn: Path) -> xarray.DataArray:
+def ExcitationRates(
+    kinfn: Path,
+    tReq: datetime = None,
+    chunks: int = None,
+    method: str = "nearest",
+    alt_range: Sequence[float] = None,
+    params: Sequence[str] = None,
+    dtype: Any = float,
+    workers: int = 1,
+) -> xarray.DataArray:
     """
     Michael Hirsch 2014
     Parses the ASCII dir.output/emissions.dat in milliseconds
@@ -536,8 +940,17 @@ def ExcitationRates(kinfn: Path) -> xarray.DataArray:
     NprecipCol: 2, this accounts for e and fluxdown (each taking one column)
     NdataCol: number of data elements per altitude + 1
     NumData: number of data elements to read at this time step
+
+    tReq: optional, only parse the time step nearest this time, located by excratesindex().
+          A sequence of times gives a DataArray with these times, see taketimes().
+    chunks: optional, number of time steps per chunk of a lazy dask-backed DataArray
+    method: "nearest", "previous" or "linear" time step(s) for tReq
+    alt_range: optional, (lowest, highest) altitude [km] to keep
+    params: optional, names of REACTION to keep
+    dtype: of the rates, e.g. np.float32 to halve memory
+    workers: number of processes parsing the whole file, see readexcrates()
     """
-    rates = readexcrates(kinfn)
+    rates = readexcrates(kinfn, tReq, chunks, method, alt_range, params, dtype, workers)
     # breakup slightly to meet needs of simpler external programs
     # z = excite.major_axis.values
     return rates["excitation"]
@@ -561,43 +974,307 @@ def initparams(kinfn: Path) -> Tuple[Path, int, int, float, datetime, int, int,
     return kinfn, nalt, nen, dip, ctime, ndatrow, ndat, Nprecip
 
 
-def readexcrates(kinfn: Path) -> xarray.Dataset:
+@instrumented
+def readexcrates(
+    kinfn: Path,
+    tReq: datetime = None,
+    chunks: int = None,
+    method: str = "nearest",
+    alt_range: Sequence[float] = None,
+    params: Sequence[str] = None,
+    dtype: Any = float,
+    workers: int = 1,
+) -> xarray.Dataset:
+    """
+    The text is converted to float block by block straight into one preallocated array,
+    which the excitation and precip DataArrays are views of.
+
+    tReq: optional, only parse the time step nearest this time.
+          A sequence of times gives a Dataset with these times, see taketimes().
+    chunks: optional, number of time steps per chunk of a lazy dask-backed Dataset.
+            Each chunk is parsed when computed, located by excratesindex(). Requires dask.
+    method: "nearest", "previous" or "linear" time step(s) for tReq
+    alt_range: optional, (lowest, highest) altitude [km] of excitation to keep
+    params: optional, names of REACTION to keep.
+            The whole file must still be parsed, but only the selection is kept, a chunk of time steps at a time.
+    dtype: of the rates. Each block of text is parsed as float64 and cast into the preallocated array,
+           so e.g. np.float32 halves peak memory. Times are then taken from excratesindex(),
+           as float32 cannot hold the seconds of the headers exactly.
+    workers: number of processes parsing the whole file, each a range of time steps located by excratesindex(),
+             into one shared-memory array. The result is identical to serial parsing. None: one per CPU.
+             Used when neither tReq, chunks, alt_range nor params is given.
+    """
+    if excratesindex(kinfn)["time"].size == 0:
+        raise ValueError(f"{kinfn}: no complete time step yet")
+
+    if alt_range is not None or params is not None:
+        if tReq is None and chunks is None:
+            return readexcselect(kinfn, alt_range, params, dtype)
+
+        rates = readexcrates(kinfn, tReq, chunks, method, dtype=dtype)
+        rows = altslice(rates.alt_km.values, alt_range)
+
+        return rates.isel(alt_km=rows).sel(reaction=selectparams(params, REACTION))
+
+    if tReq is not None and (manytimes(tReq) or method != "nearest"):
+        return taketimes(lambda i: readexcruns(kinfn, i, dtype), excratesindex(kinfn)["time"], tReq, method)
+    if tReq is not None:
+        i = searchtime(excratesindex(kinfn)["time"], tReq)
+        return readexcrecords(kinfn, i, i + 1, dtype).isel(time=0)
+    if chunks is not None:
+        from .lazy import lazyexcrates
+
+        return lazyexcrates(kinfn, chunks, dtype)
 
     kinfn, nalt, nen, dipangle, ctime, ndatrow, ndat, Nprecip = initparams(kinfn)
+    exact = np.dtype(dtype) == np.float64
+    if workers != 1:
+        from .parallel import parexcstream
+
+        with phase("parse") as p:
+            dstream, n = parexcstream(kinfn, workers, dtype)
+            p["bytes"] += kinfn.stat().st_size
+            p["records"] += dstream.shape[0]
+
+        if n < dstream.size:
+            raise ValueError(f"{kinfn}: expected {dstream.size} values in {dstream.shape[0]} time steps, found {n}")
+
+        return parseexcrates(dstream, nalt, nen, ndat, Nprecip, t=None if exact else excratesindex(kinfn)["time"])
     # using read_csv was vastly slower!
+    # the time steps are counted by excratesindex() whatever the path, so they are the same for any dtype and workers
+    index = excratesindex(kinfn)
+    t = index["time"]
+    n_t = t.size
 
-    with kinfn.open("r") as f:
-        dstream = np.asarray(f.read().split()).astype(float)
-    # print(time()-tic)
-    nhead = NumPerRow
-    size_record = ndat + Nprecip + nhead
-    n_t = dstream.size // size_record
+    with phase("parse") as p:
+        dstream = np.empty((n_t, NumPerRow + ndat + Nprecip), dtype)
+        with kinfn.open("rb") as f:
+            n = readfloats(f, dstream.reshape(-1), index["end"][-1])
+            p["bytes"] += f.tell()
+        p["records"] += n_t
 
-    t = np.empty(n_t, datetime)
-    excrate = xarray.DataArray(np.empty((n_t, nalt, 10)), dims=["time", "alt_km", "reaction"])
-    excrate["reaction"] = ["no1d", "no1s", "noii2p", "nn2a3", "po3p3p", "po3p5p", "p1ng", "pmein", "p2pg", "p1pg"]
+    if n < dstream.size:
+        raise ValueError(f"{kinfn}: expected {dstream.size} values in {n_t} time steps, found {n}")
 
-    precip = xarray.DataArray(data=np.empty((n_t, nen, NprecipCol)), dims=["time", "e", "fluxdown"])
+    return parseexcrates(dstream, nalt, nen, ndat, Nprecip, t=None if exact else t)
 
-    for i in range(n_t):
-        cind = np.s_[i * size_record: (i + 1) * size_record]
-        crec = dstream[cind]
 
-        # h = crec[:nhead] #unused
-        d = crec[nhead:-Nprecip].reshape((nalt, NdataCol), order="C")
-        # blank nan are between data and precip
-        p = crec[-Nprecip:].reshape((nen, NprecipCol), order="C")
+def readexcselect(
+    kinfn: Path, alt_range: Sequence[float] = None, params: Sequence[str] = None, dtype: Any = float
+) -> xarray.Dataset:
+    """
+    readexcrates() keeping only altitudes alt_range and reactions params of excitation.
+    The file is parsed a chunk of time steps at a time, located by excratesindex(),
+    so the full-size values are never all in memory.
+    """
+    kinfn, nalt, nen, dipangle, ctime, ndatrow, ndat, Nprecip = initparams(kinfn)
+    index = excratesindex(kinfn)
+    n_t = index["time"].size
+
+    alt = readexcstream(kinfn, n_t - 1, n_t, dtype)[0, NumPerRow: NumPerRow + ndat: NdataCol]
+    rows = altslice(alt, alt_range)
+    params = selectparams(params, REACTION)
+    cols = [1 + REACTION.index(q) for q in params]
+
+    excrate = np.empty((n_t, alt[rows].size, len(cols)), dtype)
+    precip = np.empty((n_t, Nprecip), dtype)
+
+    chunk = max(1, blocksize // (index["end"][0] - index["start"][0]))
+    for i0 in range(0, n_t, chunk):
+        i1 = min(i0 + chunk, n_t)
+        dstream = readexcstream(kinfn, i0, i1, dtype)
+        excrate[i0:i1] = dstream[:, NumPerRow: NumPerRow + ndat].reshape((i1 - i0, nalt, NdataCol))[:, rows][:, :, cols]
+        precip[i0:i1] = dstream[:, NumPerRow + ndat:]
+
+    t = index["time"]
+
+    return xarray.Dataset(
+        {
+            "excitation": xarray.DataArray(
+                excrate,
+                dims=["time", "alt_km", "reaction"],
+                coords={"time": t, "alt_km": alt[rows], "reaction": params},
+            ),
+            "precip": xarray.DataArray(precip.reshape((n_t, nen, NprecipCol)), dims=["time", "e", "fluxdown"], coords={"time": t}),
+        }
+    )
 
-        t[i] = parseheadtime(crec[:2])
 
-        excrate[i, ...] = d[:, 1:]
+def excratesindex(kinfn: Path) -> Dict[str, np.ndarray]:
+    """
+    byte offsets and times of each complete time step of emissions.dat.
+    Built by one pass counting newlines, then only the header line of each time step is parsed.
+    A time step is complete when its last line is newline-terminated.
+    The last time step of a file that does not end with a newline is complete when its unterminated last line
+    is as long as the last line of the time step before it. Without a time step before it to compare with,
+    the first time step is complete only once newline-terminated.
+    The index is empty while not even the first time step is complete.
+    The index is kept for reuse until the file changes, one per file, for the io.NKEEP files last used.
+
+    returns:
+    start: byte offset of first line of each time step
+    end: byte offset just past last line of each time step
+    time: datetime64 of each time step
+    """
+    kinfn = Path(kinfn).expanduser()
+    stat = kinfn.stat()
+    key = str(kinfn.resolve())
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    index = recallindex(_excindex, key, stamp)
+    if index is not None:
+        return index
+
+    ndat, Nprecip = initparams(kinfn)[6:8]
+    nlines = excrecordlines(ndat, Nprecip)
+
+    with phase("index") as p, kinfn.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        p["bytes"] += stat.st_size
+        buf = np.frombuffer(mm, np.uint8)
+        ends = [np.empty(0, int)]
+        nl = 0  # newlines before this block
+        for i in range(0, buf.size, blocksize):
+            pos = np.flatnonzero(buf[i: i + blocksize] == ord("\n")) + i
+            # newline number nl + j ends a time step if nl + j + 1 is a multiple of nlines
+            ends.append(pos[(-(nl + 1)) % nlines:: nlines] + 1)
+            nl += pos.size
+        del buf
+
+        end = np.concatenate(ends)
+
+        last = mm[mm.rfind(b"\n") + 1:]  # unterminated last line of the file, if any
+        if end.size and last.strip() and (nl + 1) % nlines == 0:
+            if len(last.rstrip()) == len(mm[mm.rfind(b"\n", 0, end[-1] - 1) + 1: end[-1] - 1].rstrip()):
+                end = np.append(end, stat.st_size)
+
+        start = np.append(0, end[:-1])[: end.size]
+        # the header line of each time step
+        head = textfloats(b"\n".join(mm[i: mm.find(b"\n", i)] for i in start), kinfn).reshape((-1, NumPerRow))
+
+    t = parseexcheaders(head)["time"] if end.size else np.empty(0, "datetime64[ns]")
+    index = {"start": start, "end": end, "time": t}
+    keepindex(_excindex, key, stamp, index)
+
+    return index
+
+
+def readexcrecords(kinfn: Path, i0: int, i1: int, dtype: Any = float) -> xarray.Dataset:
+    """seek to and parse only time steps i0 <= i < i1 of emissions.dat"""
+    kinfn, nalt, nen, dipangle, ctime, ndatrow, ndat, Nprecip = initparams(kinfn)
+
+    return parseexcrates(readexcstream(kinfn, i0, i1, dtype), nalt, nen, ndat, Nprecip, t=excratesindex(kinfn)["time"][i0:i1])
+
+
+def readexcruns(kinfn: Path, i: np.ndarray, dtype: Any = float) -> xarray.Dataset:
+    """parse time steps i (sorted) of emissions.dat, seeking to each run of consecutive time steps"""
+    kinfn, nalt, nen, dipangle, ctime, ndatrow, ndat, Nprecip = initparams(kinfn)
 
-        precip[i, ...] = p
+    runs = np.split(i, np.flatnonzero(np.diff(i) > 1) + 1)
+    dstream = np.concatenate([readexcstream(kinfn, r[0], r[-1] + 1, dtype) for r in runs])
 
-    excrate["alt_km"] = d[:, 0]
-    excrate["time"] = t
+    return parseexcrates(dstream, nalt, nen, ndat, Nprecip, t=excratesindex(kinfn)["time"][i])
 
-    precip["time"] = t
+
+def readexcstream(kinfn: Path, i0: int, i1: int, dtype: Any = float) -> np.ndarray:
+    """values of time steps i0 <= i < i1 of emissions.dat, one row per time step"""
+    index = excratesindex(kinfn)
+    ndat, Nprecip = initparams(kinfn)[6:8]
+
+    i1 = min(i1, index["end"].size)
+    dstream = np.empty((i1 - i0, NumPerRow + ndat + Nprecip), dtype)
+    with phase("parse") as p, Path(kinfn).expanduser().open("rb") as f:
+        f.seek(index["start"][i0])
+        readfloats(f, dstream.reshape(-1), index["end"][i1 - 1] - index["start"][i0])
+        p["bytes"] += index["end"][i1 - 1] - index["start"][i0]
+        p["records"] += i1 - i0
+
+    return dstream
+
+
+def readfloats(f: IO[bytes], out: np.ndarray, nbytes: int = None) -> int:
+    """
+    fill flat array out with the whitespace-delimited numbers of text file f, from its current position.
+    Numbers beyond the size of out are ignored.
+    nbytes: optional, read no more than this many bytes
+
+    returns: count of numbers read into out
+    """
+    n = 0
+    tail = b""
+    while n < out.size:
+        block = f.read(blocksize if nbytes is None else min(blocksize, nbytes))
+        if nbytes is not None:
+            nbytes -= len(block)
+        buf = tail + block
+        if block:
+            # a number may be split across blocks, carry it over
+            cut = max(buf.rfind(c) for c in (b" ", b"\n", b"\r", b"\t")) + 1
+            buf, tail = buf[:cut], buf[cut:]
+        elif not buf:
+            break
+        else:
+            tail = b""
+
+        val = textfloats(buf, getattr(f, "name", ""))
+        k = min(val.size, out.size - n)
+        out[n: n + k] = val[:k]
+        n += k
+
+    return n
+
+
+def textfloats(buf: bytes, fn: Union[str, Path] = None) -> np.ndarray:
+    """convert whitespace-delimited ASCII numbers to float, without intermediate strings"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(buf, sep=" ")
+        except DeprecationWarning:
+            raise ValueError(f"{fn}: could not convert text to numbers")
+
+
+def excrecordlines(ndat: int, Nprecip: int) -> int:
+    """
+    number of text lines in one emissions.dat time step: header line,
+    then ndat excitation values and Nprecip precipitation values, each block NumPerRow per line from a new line
+    """
+    return 1 + -(-ndat // NumPerRow) + -(-Nprecip // NumPerRow)
+
+
+def parseexcrates(
+    dstream: np.ndarray, nalt: int, nen: int, ndat: int, Nprecip: int, t: np.ndarray = None, alt: np.ndarray = None
+) -> xarray.Dataset:
+    """
+    split the values of whole emissions.dat time steps into excitation rates and precipitation
+
+    dstream: flat, or one row per time step
+    t, alt: optional time and altitude coordinates, when not to be taken from dstream (e.g. a lazy dask array)
+    """
+    nhead = NumPerRow
+    size_record = ndat + Nprecip + nhead
+
+    if dstream.ndim == 1:
+        n_t = dstream.size // size_record
+        dstream = dstream[: n_t * size_record].reshape((n_t, size_record))
+    n_t = dstream.shape[0]
+
+    with phase("decode") as p:
+        if t is None:
+            t = parseexcheaders(dstream[:, :nhead])["time"]
+        p["records"] += n_t
+    # blank nan are between data and precip
+    d = dstream[:, nhead: nhead + ndat].reshape((n_t, nalt, NdataCol))
+    if alt is None:
+        alt = d[-1, :, 0]
+
+    excrate = xarray.DataArray(
+        d[..., 1:],
+        dims=["time", "alt_km", "reaction"],
+        coords={"time": t, "alt_km": alt, "reaction": REACTION},
+    )
+
+    precip = xarray.DataArray(
+        dstream[:, nhead + ndat:].reshape((n_t, nen, NprecipCol)), dims=["time", "e", "fluxdown"], coords={"time": t}
+    )
 
     rates = xarray.Dataset({"excitation": excrate, "precip": precip})
 
@@ -625,3 +1302,36 @@ def getHeader(line: str) -> Tuple[datetime, float, int, int]:
 
 def parseheadtime(h: np.ndarray) -> datetime:
     return datetime.strptime(str(int(h[0])), "%Y%j") + timedelta(seconds=float(h[1]))
+
+
+def excheadtime(h: np.ndarray) -> np.ndarray:
+    """vectorized parseheadtime(): h[..., 0] is YYYYDDD, h[..., 1] is UTC second of day"""
+    yd = h[..., 0].astype(int)
+
+    day = (yd // 1000 - 1970).astype("datetime64[Y]").astype("datetime64[D]") + (yd % 1000 - 1)
+    nsec = np.round(h[..., 1] * 1e9).astype("timedelta64[ns]")
+
+    return day.astype("datetime64[ns]") + nsec
+
+
+def parseexcheaders(h: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    vectorized getHeader() of many emissions.dat time steps at once
+
+    h: n_t x NumPerRow header values
+    returns: vectors of time (datetime64[ns]), dipangle [deg], nalt, nen
+    """
+    h = np.atleast_2d(h)
+
+    checks = {
+        "day of year": (1 <= h[:, 0] % 1000) & (h[:, 0] % 1000 <= 366),
+        "second of day": h[:, 1] >= 0,
+        "nalt": (h[:, 3] > 0) & (h[:, 3] == h[0, 3]),
+        "nen": (h[:, 4] > 0) & (h[:, 4] == h[0, 4]),
+    }
+    for k, ok in checks.items():
+        if not ok.all():
+            i = np.flatnonzero(~ok)
+            raise ValueError(f"header {k} of {i.size} time steps is invalid, first at time step {i[0]}. Is this emissions.dat?")
+
+    return {"time": excheadtime(h), "dipangle": 90.0 - h[:, 2], "nalt": h[:, 3].astype(int), "nen": h[:, 4].astype(int)}
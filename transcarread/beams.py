@@ -0,0 +1,78 @@
+"""
+load all beams of a Transcar simulation, one beam per process
+"""
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, Callable, List
+import xarray
+
+from . import readexcrates, calcVERtc, KINFN, SimpleSim
+
+
+def beamdirs(root: Path, kinfn: str = KINFN) -> List[Path]:
+    """beam* directories under root that have Transcar kinetic output, in order of beam energy"""
+    root = Path(root).expanduser()
+    if not root.is_dir():
+        raise NotADirectoryError(root)
+
+    return sorted((d for d in root.glob("beam*") if (d / kinfn).is_file()), key=beamenergy)
+
+
+def beamenergy(path: Path) -> float:
+    """beam energy [eV] from directory name, e.g. beam52.7 is 52.7 eV"""
+    return float(Path(path).name[4:])
+
+
+def loadbeams(root: Path, tReq: datetime = None, workers: int = None, kinfn: str = KINFN) -> xarray.Dataset:
+    """
+    excitation rates and precipitation of every beam under root, stacked by beam energy.
+
+    Parameters
+    ----------
+    root: directory the beam* directories are in
+    tReq: optional, only load the time step nearest this time
+    workers: number of processes. 1 loads serially. None: one per CPU
+    kinfn: path of emissions.dat under each beam directory
+
+    Returns
+    -------
+    rates: Dataset as from readexcrates() with leading dimension beam_energy_eV
+    """
+    dirs = beamdirs(root, kinfn)
+    if not dirs:
+        raise FileNotFoundError(f"no beams found in {root}")
+
+    return _stack(dirs, workers, readexcrates, [d / kinfn for d in dirs], repeat(tReq))
+
+
+def calcVERbeams(
+    root: Path, tReq: datetime, config_fn: Path, sim: SimpleSim = None, workers: int = None, kinfn: str = KINFN
+) -> xarray.DataArray:
+    """
+    calcVERtc(beamdir, tReq, config_fn, sim) of every beam under root, stacked by beam energy.
+    Each beam keeps its own fallback to the end of its precipitation time.
+
+    workers: number of processes. 1 loads serially. None: one per CPU
+    kinfn: path of emissions.dat under each beam directory, to find the beams
+    """
+    dirs = beamdirs(root, kinfn)
+    if not dirs:
+        raise FileNotFoundError(f"no beams found in {root}")
+
+    return _stack(dirs, workers, calcVERtc, dirs, repeat(tReq), repeat(config_fn), repeat(sim))
+
+
+def _stack(dirs: List[Path], workers: int, func: Callable[..., Any], *args) -> Any:
+    """func(*args) of each beam, serially or in a process pool, concatenated along beam_energy_eV"""
+    if workers == 1:
+        rates = list(map(func, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as exe:
+            rates = list(exe.map(func, *args))
+
+    rates = xarray.concat(rates, dim="beam_energy_eV", join="outer")
+    rates["beam_energy_eV"] = [beamenergy(d) for d in dirs]
+
+    return rates
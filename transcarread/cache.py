@@ -0,0 +1,178 @@
+"""
+on-disk cache of parsed Transcar output, as compressed NetCDF4
+
+    cache = Cache("~/.cache/transcarread")
+    iono = cache.read_tra(path)
+
+The cached copy is used as long as the source file size and modification time
+(and optionally SHA-256 hash) are unchanged.
+The least recently used cache files are deleted when the cache exceeds maxbytes.
+"""
+from pathlib import Path
+from datetime import datetime
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Callable, Dict
+import xarray
+
+from . import read_tra, readexcrates, readmsis
+
+COMPRESS = {"zlib": True, "complevel": 4}
+
+
+class Cache:
+    """
+    Parameters
+    ----------
+    cachedir: directory of cache files, shared by all runs
+    maxbytes: total size of cache files kept
+    usehash: also check the SHA-256 hash of the source file, not just size and modification time
+    engine: xarray NetCDF4 engine, "netcdf4" or "h5netcdf". None: xarray default
+    """
+
+    def __init__(self, cachedir: Path, maxbytes: int = 10 * 2 ** 30, usehash: bool = False, engine: str = None):
+        self.cachedir = Path(cachedir).expanduser()
+        self.maxbytes = maxbytes
+        self.usehash = usehash
+        self.engine = engine
+
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+
+    def read_tra(self, path: Path, tReq: datetime = None) -> xarray.Dataset:
+        """cached transcarread.read_tra()"""
+        path = Path(path).expanduser()
+        return self.cached(read_tra, path / "dir.output/transcar_output", path, tReq)
+
+    def readexcrates(self, kinfn: Path, tReq: datetime = None) -> xarray.Dataset:
+        """cached transcarread.readexcrates()"""
+        return self.cached(readexcrates, kinfn, kinfn, tReq)
+
+    def ExcitationRates(self, kinfn: Path, tReq: datetime = None) -> xarray.DataArray:
+        """cached transcarread.ExcitationRates()"""
+        return self.readexcrates(kinfn, tReq)["excitation"]
+
+    def readmsis(self, ifn: Path) -> xarray.Dataset:
+        """cached transcarread.readmsis() without interpolation"""
+        return self.cached(readmsis, ifn, ifn)
+
+    def cached(self, reader: Callable[..., xarray.Dataset], source: Path, *args) -> xarray.Dataset:
+        """
+        return reader(*args) from cache if source is unchanged, else call reader and cache the result
+        """
+        source = Path(source).expanduser().resolve()
+        stamp = self.stamp(source)
+
+        key = json.dumps([reader.__name__, str(source), [str(a) for a in args]])
+        cfn = self.cachedir / (hashlib.sha1(key.encode()).hexdigest() + ".nc")
+
+        if cfn.is_file():
+            try:
+                with xarray.open_dataset(cfn, engine=self.engine) as f:
+                    if all(f.attrs.get(k) == v for k, v in stamp.items()):
+                        dat = _decode(f.load())
+                        with contextlib.suppress(FileNotFoundError):  # evicted meanwhile by another process
+                            os.utime(cfn)  # most recently used
+                        return dat
+            except (OSError, ValueError) as e:
+                logging.warning(f"ignoring unreadable cache file {cfn}: {e}")
+
+        dat = reader(*args)
+        self.write(dat, stamp, cfn)
+
+        return dat
+
+    def stamp(self, source: Path) -> Dict[str, Any]:
+        """what has to match for a cache file to be current"""
+        return stamp(source, self.usehash)
+
+    def write(self, dat: xarray.Dataset, stamp: Dict[str, Any], cfn: Path):
+        """
+        write atomically, so a reader on shared storage never sees a partial file.
+        The temporary file is not named *.nc, so evict() of another process leaves it alone.
+        """
+        enc = _encode(dat)
+        enc.attrs.update(stamp)
+
+        fd, tmp = tempfile.mkstemp(suffix=".nc.part", dir=self.cachedir)
+        os.close(fd)
+        try:
+            enc.to_netcdf(tmp, engine=self.engine, encoding={v: COMPRESS for v in enc.data_vars})
+            os.replace(tmp, cfn)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        self.evict()
+
+    def evict(self):
+        """
+        delete least recently used cache files until total size is within maxbytes.
+        Files replaced or deleted meanwhile by other processes sharing the cache are skipped.
+        """
+        files = []
+        for f in self.cachedir.glob("*.nc"):
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        total = sum(f[1] for f in files)
+
+        for _, size, f in sorted(files):
+            if total <= self.maxbytes:
+                break
+            logging.info(f"evicting {f}")
+            with contextlib.suppress(FileNotFoundError):
+                f.unlink()
+            total -= size
+
+
+def stamp(source: Path, usehash: bool = False) -> Dict[str, Any]:
+    """size and modification time, and optionally SHA-256 hash, of source, to tell if a file derived from it is current"""
+    stat = source.stat()
+    st: Dict[str, Any] = {"source": str(source), "source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+    if usehash:
+        h = hashlib.sha256()
+        with source.open("rb") as f:
+            for block in iter(lambda: f.read(2 ** 24), b""):
+                h.update(block)
+        st["source_sha256"] = h.hexdigest()
+
+    return st
+
+
+def _encode(dat: xarray.Dataset) -> xarray.Dataset:
+    """attributes that NetCDF can't store: header dict as JSON, Path as str"""
+    enc = dat.copy()
+    enc.attrs = {k: _attr(v) for k, v in dat.attrs.items()}
+    for v in enc.variables.values():
+        v.attrs = {k: _attr(a) for k, a in v.attrs.items()}
+
+    return enc
+
+
+def _attr(v: Any) -> Any:
+    if isinstance(v, dict):
+        return json.dumps({k: a.isoformat() if isinstance(a, datetime) else getattr(a, "item", lambda: a)() for k, a in v.items()})
+    if isinstance(v, Path):
+        return str(v)
+    return v
+
+
+def _decode(dat: xarray.Dataset) -> xarray.Dataset:
+    """undo _encode() and drop the cache stamp"""
+    for k in list(dat.attrs):
+        if k.startswith("source"):
+            del dat.attrs[k]
+
+    if "hd" in dat.attrs:
+        hd = json.loads(dat.attrs["hd"])
+        hd["htime"] = datetime.fromisoformat(hd["htime"])
+        dat.attrs["hd"] = hd
+
+    return dat
@@ -0,0 +1,239 @@
+"""
+SQLite catalog of the runs of simulation trees, to find runs without opening their files
+
+    cat = Catalog("~/sims/catalog.sqlite")
+    cat.update("~/sims")
+    paths = cat.query(energy=(100, 1000), precip=datetime(2013, 3, 31, 9, 0, 30))
+
+Each beam* directory with a dir.output is a run. For each run, the catalog records
+the DATCAR parameters, the time span, nx and ncol of transcar_output, file sizes,
+and the peak electron density and its altitude.
+update() rescans only runs whose DATCAR, transcar_output or emissions.dat changed, in parallel processes.
+Times are stored as ISO 8601 text with microseconds, so they sort and compare as text.
+"""
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from . import read_tra, readtraheader, readTranscarInput, tratimes, KINFN, PPINPUTS, d_bytes
+from .beams import beamenergy
+from .cli import findruns, TRAFN, DATFN
+
+# queryable columns, besides path and the JSON of all DATCAR parameters
+COLUMNS = {
+    "beam_energy_eV": "REAL",
+    "tstart": "TEXT",
+    "tend": "TEXT",
+    "n_t": "INTEGER",
+    "nx": "INTEGER",
+    "ncol": "INTEGER",
+    "tstartPrecip": "TEXT",
+    "tendPrecip": "TEXT",
+    "latgeo": "REAL",
+    "longeo": "REAL",
+    "f107ind": "REAL",
+    "f107avg": "REAL",
+    "apind": "REAL",
+    "ne_max": "REAL",
+    "ne_max_alt_km": "REAL",
+    "tra_bytes": "INTEGER",
+    "exc_bytes": "INTEGER",
+}
+SOURCES = {"datcar": DATFN, "tra": TRAFN, "exc": KINFN}
+
+
+class Catalog:
+    """
+    Parameters
+    ----------
+    dbfn: SQLite database file, created if needed
+    """
+
+    def __init__(self, dbfn: Path):
+        self.dbfn = Path(dbfn).expanduser()
+        self.dbfn.parent.mkdir(parents=True, exist_ok=True)
+
+        cols = ", ".join(f"{k} {v}" for k, v in COLUMNS.items())
+        stamps = ", ".join(f"{k}_stamp TEXT" for k in SOURCES)
+        with closing(self._connect()) as con, con:
+            con.execute(f"CREATE TABLE IF NOT EXISTS runs (path TEXT PRIMARY KEY, {cols}, {stamps}, datcar TEXT)")
+            for k in ("beam_energy_eV", "tstart", "tend", "tstartPrecip", "latgeo"):
+                con.execute(f"CREATE INDEX IF NOT EXISTS runs_{k} ON runs ({k})")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.dbfn)
+
+    def update(self, root: Path, workers: int = None) -> Dict[str, int]:
+        """
+        scan new and changed runs under root, and forget runs under root that are gone
+
+        workers: number of processes. 1 scans serially. None: one per CPU
+
+        returns: number of runs "scanned", "unchanged", "removed", "failed"
+        """
+        root = Path(root).expanduser().resolve()
+        runs = findruns(root)
+        prefix = str(root) + os.sep
+
+        with closing(self._connect()) as con:
+            known = dict(
+                con.execute(
+                    "SELECT path, datcar_stamp || tra_stamp || exc_stamp FROM runs WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix),
+                ).fetchall()
+            )
+
+        todo = []
+        for r in runs:
+            st = stamps(r)
+            if known.get(str(r)) != "".join(st.values()):
+                todo.append(r)
+
+        if workers == 1:
+            rows = list(map(_safescan, todo))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as exe:
+                rows = list(exe.map(_safescan, todo))
+
+        gone = set(known) - {str(r) for r in runs}
+        names = ["path"] + list(COLUMNS) + [f"{k}_stamp" for k in SOURCES] + ["datcar"]
+        with closing(self._connect()) as con, con:
+            con.executemany(
+                f"INSERT OR REPLACE INTO runs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                [[row.get(k) for k in names] for row in rows if row is not None],
+            )
+            con.executemany("DELETE FROM runs WHERE path = ?", [(p,) for p in gone])
+
+        failed = sum(row is None for row in rows)
+
+        return {"scanned": len(todo) - failed, "unchanged": len(runs) - len(todo), "removed": len(gone), "failed": failed}
+
+    def query(
+        self,
+        energy: Tuple[float, float] = None,
+        time: datetime = None,
+        precip: datetime = None,
+        latgeo: Tuple[float, float] = None,
+        longeo: Tuple[float, float] = None,
+        where: str = None,
+        args: Sequence[Any] = (),
+    ) -> List[Path]:
+        """
+        paths of runs matching all of the criteria given, in order of beam energy
+
+        energy: (lowest, highest) beam energy [eV]
+        time: within the time span of transcar_output
+        precip: within the precipitation time of DATCAR
+        latgeo, longeo: (lowest, highest) geographic latitude, longitude [deg] of DATCAR
+        where: any other SQL condition on the columns of COLUMNS, with "?" placeholders for args,
+               e.g. where="ne_max > ?", args=(1e12,)
+        """
+        cond: List[str] = []
+        vals: List[Any] = []
+        for col, rng in (("beam_energy_eV", energy), ("latgeo", latgeo), ("longeo", longeo)):
+            if rng is not None:
+                cond.append(f"{col} BETWEEN ? AND ?")
+                vals += list(rng)
+        for lo, hi, t in (("tstart", "tend", time), ("tstartPrecip", "tendPrecip", precip)):
+            if t is not None:
+                cond.append(f"? BETWEEN {lo} AND {hi}")
+                vals.append(_iso(t))
+        if where:
+            cond.append(f"({where})")
+            vals += list(args)
+
+        sql = "SELECT path FROM runs" + (" WHERE " + " AND ".join(cond) if cond else "") + " ORDER BY beam_energy_eV, path"
+        with closing(self._connect()) as con:
+            return [Path(r[0]) for r in con.execute(sql, vals)]
+
+    def get(self, path: Path) -> Optional[Dict[str, Any]]:
+        """catalog entry of run path, with "datcar" decoded to a dict, or None if not cataloged"""
+        with closing(self._connect()) as con:
+            con.row_factory = sqlite3.Row
+            row = con.execute("SELECT * FROM runs WHERE path = ?", (str(Path(path).expanduser().resolve()),)).fetchone()
+
+        if row is None:
+            return None
+
+        entry = dict(row)
+        entry["datcar"] = json.loads(entry["datcar"]) if entry["datcar"] else None
+
+        return entry
+
+
+def stamps(run: Path) -> Dict[str, str]:
+    """size and modification time of each source file of run, "-" if missing"""
+    st = {}
+    for k, fn in SOURCES.items():
+        try:
+            s = (run / fn).stat()
+            st[f"{k}_stamp"] = f"{s.st_size}:{s.st_mtime_ns};"
+        except FileNotFoundError:
+            st[f"{k}_stamp"] = "-;"
+
+    return st
+
+
+def scanrun(run: Path) -> Dict[str, Any]:
+    """catalog entry of run directory, from its DATCAR, transcar_output header and times, and electron density"""
+    row: Dict[str, Any] = {"path": str(run), **stamps(run)}
+    try:
+        row["beam_energy_eV"] = beamenergy(run)
+    except ValueError:
+        pass
+
+    datfn = run / DATFN
+    if datfn.is_file():
+        H = readTranscarInput(datfn)
+        row.update(
+            tstartPrecip=_iso(H["tstartPrecip"]),
+            tendPrecip=_iso(H["tendPrecip"]),
+            latgeo=H["latgeo_ini"],
+            longeo=H["longeo_ini"],
+            f107ind=H["f107ind"],
+            f107avg=H["f107avg"],
+            apind=H["apind"],
+            datcar=json.dumps({k: _iso(v) if isinstance(v, datetime) else v for k, v in H.items()}),
+        )
+
+    tcofn = run / TRAFN
+    hd = readtraheader(tcofn) if tcofn.is_file() else None
+    if hd is not None and tcofn.stat().st_size >= hd["size_record"] * d_bytes:
+        t = tratimes(tcofn, hd)
+        ne = read_tra(run, params=PPINPUTS["ne"])["pp"].loc[..., "ne"]
+        i = np.unravel_index(int(np.nanargmax(ne.values)), ne.shape)
+        row.update(
+            tstart=_iso(t[0]),
+            tend=_iso(t[-1]),
+            n_t=t.size,
+            nx=int(hd["nx"]),
+            ncol=int(hd["ncol"]),
+            ne_max=float(ne.values[i]),
+            ne_max_alt_km=float(ne.alt_km[i[1]]),
+            tra_bytes=tcofn.stat().st_size,
+        )
+
+    if (run / KINFN).is_file():
+        row["exc_bytes"] = (run / KINFN).stat().st_size
+
+    return row
+
+
+def _safescan(run: Path) -> Optional[Dict[str, Any]]:
+    """scanrun(), logging an error instead of stopping the other scans"""
+    try:
+        return scanrun(run)
+    except Exception as e:
+        logging.error(f"{run}: {e}")
+        return None
+
+
+def _iso(t: Any) -> str:
+    return str(np.datetime64(t, "us"))
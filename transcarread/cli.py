@@ -0,0 +1,184 @@
+"""
+command line interface, installed as the "transcarread" console script
+
+    transcarread convert ~/sims/campaign --out ~/sims/campaign_nc -j 8
+
+converts dir.output/transcar_output and dir.output/emissions.dat of every beam*/dir.output under ROOT
+to compressed NetCDF4 (or Zarr), with the dir.input/DATCAR parameters as attribute "datcar".
+The tree under ROOT is mirrored under OUTDIR, e.g. ROOT/beam52.7/transcar_output.nc.
+
+Outputs whose source and DATCAR are unchanged since conversion are skipped, so an interrupted
+conversion resumes by running the same command again. Each output is written to a temporary
+name and renamed when complete, so a partial output is never mistaken for a converted one.
+"""
+from pathlib import Path
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Sequence
+import xarray
+
+from . import read_tra, readexcrates, readTranscarInput, KINFN
+from .cache import stamp, _encode, COMPRESS
+
+FORMATS = {"netcdf": ".nc", "zarr": ".zarr"}
+TRAFN = "dir.output/transcar_output"
+DATFN = "dir.input/DATCAR"
+
+
+def findruns(root: Path) -> List[Path]:
+    """beam* directories with a dir.output at any depth under root, in path order"""
+    root = Path(root).expanduser()
+    if not root.is_dir():
+        raise NotADirectoryError(root)
+
+    return sorted(d.parent for d in root.glob("**/beam*/dir.output") if d.is_dir())
+
+
+def convert(root: Path, outdir: Path, jobs: int = None, fmt: str = "netcdf", force: bool = False) -> List[Dict[str, Any]]:
+    """
+    convert every run under root, one file per process
+
+    jobs: number of processes. 1 converts serially. None: one per CPU
+    fmt: "netcdf" or "zarr"
+    force: convert even if the output is up to date
+
+    returns: for each source file, dict of source, output, status ("converted", "skipped", "failed"), bytes, seconds
+    """
+    root = Path(root).expanduser()
+    outdir = Path(outdir).expanduser()
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt}, choose from {list(FORMATS)}")
+
+    tasks = []
+    for run in findruns(root):
+        for src in (run / TRAFN, run / KINFN):
+            if src.is_file():
+                ofn = outdir / run.relative_to(root) / (src.name.split(".")[0] + FORMATS[fmt])
+                tasks.append((src, ofn, run / DATFN, fmt, force))
+    # largest first, so the pool is not left waiting on one big file at the end
+    tasks.sort(key=lambda t: t[0].stat().st_size, reverse=True)
+
+    if jobs == 1:
+        return [_safe(*t) for t in tasks]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as exe:
+        for f in as_completed([exe.submit(_safe, *t) for t in tasks]):
+            results.append(f.result())
+
+    return results
+
+
+def _safe(src: Path, ofn: Path, datcar: Path, fmt: str, force: bool) -> Dict[str, Any]:
+    """convertfile(), reporting an error as status "failed" so the other files are still converted"""
+    try:
+        return convertfile(src, ofn, datcar, fmt, force)
+    except Exception as e:
+        logging.error(f"{src}: {e}")
+        return {"source": src, "output": ofn, "status": "failed", "bytes": 0, "seconds": 0.0}
+
+
+def convertfile(src: Path, ofn: Path, datcar: Path = None, fmt: str = "netcdf", force: bool = False) -> Dict[str, Any]:
+    """convert one transcar_output or emissions.dat to ofn, unless ofn is up to date"""
+    tic = time.monotonic()
+    st = stamp(src)
+    if datcar is not None and datcar.is_file():
+        st["datcar_mtime_ns"] = datcar.stat().st_mtime_ns
+
+    res = {"source": src, "output": ofn, "bytes": st["source_size"]}
+
+    if not force and current(ofn, st, fmt):
+        logging.info(f"{ofn} is up to date")
+        return {**res, "status": "skipped", "bytes": 0, "seconds": 0.0}
+
+    if src.name == Path(TRAFN).name:
+        dat = read_tra(src.parents[1])
+    else:
+        dat = readexcrates(src)
+    if "datcar_mtime_ns" in st:
+        dat.attrs["datcar"] = readTranscarInput(datcar)
+
+    write(dat, st, ofn, fmt)
+    logging.info(f"{src} => {ofn}")
+
+    return {**res, "status": "converted", "seconds": time.monotonic() - tic}
+
+
+def current(ofn: Path, st: Dict[str, Any], fmt: str = "netcdf") -> bool:
+    """is ofn a complete conversion of the source described by stamp st"""
+    if not ofn.exists():
+        return False
+
+    try:
+        with xarray.open_dataset(ofn, engine="zarr" if fmt == "zarr" else None) as f:
+            return all(f.attrs.get(k) == v for k, v in st.items())
+    except (OSError, ValueError) as e:
+        logging.warning(f"reconverting unreadable {ofn}: {e}")
+        return False
+
+
+def write(dat: xarray.Dataset, st: Dict[str, Any], ofn: Path, fmt: str = "netcdf"):
+    """write compressed, under a temporary name renamed to ofn when complete"""
+    enc = _encode(dat)
+    enc.attrs.update(st)
+
+    ofn.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ofn.with_name(ofn.name + ".part")
+    _remove(tmp)  # left by an interrupted conversion
+
+    if fmt == "zarr":
+        enc.to_zarr(tmp, mode="w")
+        _remove(ofn)
+    else:
+        enc.to_netcdf(tmp, encoding={v: COMPRESS for v in enc.data_vars})
+
+    os.replace(tmp, ofn)
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def summary(results: Sequence[Dict[str, Any]], seconds: float) -> str:
+    """one line throughput summary of convert()"""
+    n = {s: sum(r["status"] == s for r in results) for s in ("converted", "skipped", "failed")}
+    mb = sum(r["bytes"] for r in results) / 1e6
+
+    return (
+        f"converted {n['converted']} files, {mb:.1f} MB in {seconds:.1f} s ({mb / max(seconds, 1e-9):.1f} MB/s). "
+        f"{n['skipped']} up to date, {n['failed']} failed."
+    )
+
+
+def main(argv: Sequence[str] = None) -> int:
+    p = ArgumentParser(prog="transcarread", description="Transcar output utilities")
+    p.add_argument("-v", "--verbose", help="log each file", action="store_true")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    c = sub.add_parser("convert", help="convert all beam*/dir.output under ROOT to NetCDF4 or Zarr")
+    c.add_argument("root", help="top directory of simulation tree")
+    c.add_argument("-o", "--out", help="output directory", required=True)
+    c.add_argument("-j", "--jobs", help="number of processes (default one per CPU)", type=int)
+    c.add_argument("-f", "--format", help="output format", choices=list(FORMATS), default="netcdf")
+    c.add_argument("--force", help="convert even if output is up to date", action="store_true")
+    P = p.parse_args(argv)
+
+    if P.verbose:
+        logging.basicConfig(level=logging.INFO)
+
+    tic = time.monotonic()
+    results = convert(P.root, P.out, P.jobs, P.format, P.force)
+    print(summary(results, time.monotonic() - tic))
+
+    return int(any(r["status"] == "failed" for r in results))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
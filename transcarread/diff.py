@@ -0,0 +1,224 @@
+"""
+compare two Transcar runs record by record, e.g. a new build against a reference run.
+Only one time step of each run is in memory at a time.
+
+    stats = diff_tra(ref, new, rtol=1e-5)
+    assert stats.ok, stats.to_dataframe()
+
+Time steps are matched by time, within ttol seconds. Time steps of only one run are counted, not compared.
+When the altitude grids differ, the new run is interpolated onto the reference altitudes within its range.
+A value is out of tolerance when abs(new - ref) > atol + rtol * abs(ref), as numpy.isclose(),
+or when just one of the two is NaN.
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple, Union
+import numpy as np
+import xarray
+
+from . import (
+    iter_tra,
+    excratesindex,
+    initparams,
+    readexcstream,
+    plasmaparam,
+    ppindex,
+    selectparams,
+    PARAM,
+    ISRPARAM,
+    REACTION,
+    KINFN,
+    NumPerRow,
+    NdataCol,
+    blocksize,
+)
+from .regrid import weights, interp
+
+Record = Tuple[np.datetime64, np.ndarray, np.ndarray]  # time, altitude [km], nalt x nparam values
+Tol = Union[float, Dict[str, float]]
+
+
+def records_tra(path: Path) -> Iterator[Record]:
+    """each time step of path/dir.output/transcar_output, with columns PARAM + ISRPARAM"""
+    for head, alt, data in iter_tra(path, asarray=True):
+        pp = plasmaparam(data, ppindex(PARAM), head["approx"])
+        yield np.datetime64(head["htime"], "ns"), alt, np.concatenate((data, pp), axis=1)
+
+
+def records_exc(kinfn: Path) -> Iterator[Record]:
+    """each time step of the excitation rates of emissions.dat, with columns REACTION, parsed a block at a time"""
+    kinfn, nalt, nen, dipangle, ctime, ndatrow, ndat, Nprecip = initparams(kinfn)
+    index = excratesindex(kinfn)
+    n_t = index["time"].size
+
+    chunk = max(1, blocksize // (index["end"][0] - index["start"][0]))
+    for i0 in range(0, n_t, chunk):
+        dstream = readexcstream(kinfn, i0, min(i0 + chunk, n_t))
+        for t, d in zip(index["time"][i0:], dstream[:, NumPerRow: NumPerRow + ndat].reshape((-1, nalt, NdataCol))):
+            yield t, d[:, 0], d[:, 1:]
+
+
+def diff_tra(ref: Path, new: Path, params: Sequence[str] = None, **kwargs) -> xarray.Dataset:
+    """
+    compare transcar_output of two runs, ref and new being the directories above dir.output/
+
+    params: names of PARAM and ISRPARAM to compare, default all
+    kwargs: of diff_records()
+    """
+    return diff_records(records_tra(ref), records_tra(new), PARAM + ISRPARAM, params, **kwargs)
+
+
+def diff_excrates(ref: Path, new: Path, params: Sequence[str] = None, **kwargs) -> xarray.Dataset:
+    """
+    compare excitation rates of emissions.dat of two runs.
+    ref, new: emissions.dat, or the directories above dir.output/
+
+    params: names of REACTION to compare, default all
+    kwargs: of diff_records()
+    """
+    ref, new = (Path(p).expanduser() for p in (ref, new))
+    ref, new = (p / KINFN if p.is_dir() else p for p in (ref, new))
+
+    return diff_records(records_exc(ref), records_exc(new), REACTION, params, **kwargs)
+
+
+def diff_records(
+    ref: Iterator[Record],
+    new: Iterator[Record],
+    names: List[str],
+    params: Sequence[str] = None,
+    atol: Tol = 0.0,
+    rtol: Tol = 1e-6,
+    ttol: float = 0.0,
+    failfast: bool = False,
+) -> xarray.Dataset:
+    """
+    error statistics of each parameter over all matching time steps of two time-ordered record streams
+
+    names: of the columns of the records
+    params: names to compare, default all
+    atol, rtol: absolute and relative tolerance, for all parameters or a dict by parameter name.
+                Parameters not in a dict have the default tolerance, 0 and 1e-6.
+    ttol: [seconds] time steps closer than this are compared
+    failfast: stop at the first time step with a value out of tolerance
+
+    returns: Dataset by param of
+      n: number of values compared
+      nfail: number of values out of tolerance
+      max_abs, rms_abs: maximum and root-mean-square abs(new - ref)
+      max_rel: maximum abs(new - ref) / abs(ref), where ref != 0
+      time_max_abs, alt_max_abs: where max_abs is
+    and attrs
+      ok: no value out of tolerance, and no time step of only one run
+      compared, ref_only, new_only: number of time steps
+      stopped: time of the time step failfast stopped at, else ""
+    """
+    params = selectparams(params, names)
+    cols = [names.index(q) for q in params]
+    atols = _tolerance(atol, params, 0.0)
+    rtols = _tolerance(rtol, params, 1e-6)
+    dt = np.timedelta64(int(round(ttol * 1e9)), "ns")
+
+    npar = len(params)
+    n = np.zeros(npar, int)
+    nfail = np.zeros(npar, int)
+    sumsq = np.zeros(npar)
+    max_abs = np.zeros(npar)
+    max_rel = np.zeros(npar)
+    time_max = np.full(npar, np.datetime64("NaT"), "datetime64[ns]")
+    alt_max = np.full(npar, np.nan)
+    count = {"compared": 0, "ref_only": 0, "new_only": 0}
+    stopped = ""
+    grid: Dict[str, Any] = {}
+
+    r = next(ref, None)
+    w = next(new, None)
+    while r is not None and w is not None:
+        if r[0] < w[0] - dt:
+            count["ref_only"] += 1
+            r = next(ref, None)
+            continue
+        if w[0] < r[0] - dt:
+            count["new_only"] += 1
+            w = next(new, None)
+            continue
+
+        alt, a, b = _align(r, w, cols, grid)
+        # %% statistics of this time step
+        err = np.abs(b - a)
+        both = np.isnan(a) & np.isnan(b)
+        bad = ~both & ((err > atols + rtols * np.abs(a)) | np.isnan(err))
+        err = np.where(both, 0.0, err)
+        finite = np.where(np.isnan(err), 0.0, err)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rel = np.where((a != 0) & ~np.isnan(err), finite / np.abs(a), 0.0)
+
+        n += (~both).sum(axis=0)
+        nfail += bad.sum(axis=0)
+        sumsq += (finite ** 2).sum(axis=0)
+        imax = finite.argmax(axis=0)
+        worse = finite[imax, range(npar)] > max_abs
+        max_abs[worse] = finite[imax, range(npar)][worse]
+        time_max[worse] = r[0]
+        alt_max[worse] = alt[imax][worse]
+        max_rel = np.maximum(max_rel, rel.max(axis=0))
+        count["compared"] += 1
+
+        if failfast and bad.any():
+            stopped = str(r[0])
+            break
+
+        r = next(ref, None)
+        w = next(new, None)
+
+    if not stopped:
+        count["ref_only"] += sum(1 for _ in ref) + (r is not None)
+        count["new_only"] += sum(1 for _ in new) + (w is not None)
+
+    with np.errstate(invalid="ignore"):
+        rms = np.sqrt(sumsq / n)
+
+    ok = not nfail.any() and count["ref_only"] == count["new_only"] == 0
+
+    return xarray.Dataset(
+        {
+            "n": ("param", n),
+            "nfail": ("param", nfail),
+            "max_abs": ("param", max_abs),
+            "rms_abs": ("param", rms),
+            "max_rel": ("param", max_rel),
+            "time_max_abs": ("param", time_max),
+            "alt_max_abs": ("param", alt_max),
+            "atol": ("param", atols),
+            "rtol": ("param", rtols),
+        },
+        coords={"param": params},
+        attrs={"ok": ok, **count, "stopped": stopped},
+    )
+
+
+def _tolerance(tol: Tol, params: List[str], default: float) -> np.ndarray:
+    if isinstance(tol, dict):
+        return np.array([tol.get(q, default) for q in params], dtype=float)
+    return np.full(len(params), tol, dtype=float)
+
+
+def _align(r: Record, w: Record, cols: List[int], grid: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    the compared columns of both records on a common altitude grid.
+    The interpolation weights are kept in grid while the altitude grids stay the same.
+    """
+    za = np.asarray(r[1], dtype=float)
+    zb = np.asarray(w[1], dtype=float)
+    a = np.asarray(r[2][:, cols], dtype=float)
+    b = np.asarray(w[2][:, cols], dtype=float)
+
+    if za.size == zb.size and (za == zb).all():
+        return za, a, b
+
+    if not (np.array_equal(grid.get("za"), za) and np.array_equal(grid.get("zb"), zb)):
+        keep = (za >= zb[0]) & (za <= zb[-1])
+        if not keep.any():
+            raise ValueError(f"altitude grids do not overlap: {za[0]:.1f} .. {za[-1]:.1f} and {zb[0]:.1f} .. {zb[-1]:.1f} km")
+        grid.update(za=za, zb=zb, keep=keep, w=weights(zb, za[keep]))
+
+    return za[grid["keep"]], a[grid["keep"]], interp(b, *grid["w"])
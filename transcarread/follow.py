@@ -0,0 +1,98 @@
+"""
+follow the output of a Transcar run that is still being written.
+Only complete time steps are returned; a partially written trailing time step is
+read on a later poll, once the simulation has finished writing it.
+"""
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Iterator
+import numpy as np
+import xarray
+
+from . import readtraheader, iter_tra, initparams, excrecordlines, parseexcrates, textfloats, d_bytes, nhead
+
+
+def follow_tra(path: Path, interval: float = 1.0, timeout: float = None) -> Iterator[xarray.Dataset]:
+    """
+    yield each new time step of dir.output/transcar_output as the simulation writes it
+
+    Parameters
+    ----------
+    path: directory above dir.output/transcar_output
+    interval: seconds between polls of the file size
+    timeout: stop after this many seconds without a new time step. None: follow forever.
+    """
+    path = Path(path).expanduser()
+    tcofn = path / "dir.output/transcar_output"
+
+    hd = None
+    done = 0  # number of time steps already yielded
+    tlast = monotonic()
+
+    while True:
+        if hd is None and tcofn.is_file() and tcofn.stat().st_size >= nhead * d_bytes:
+            hd = readtraheader(tcofn)
+
+        if hd is not None and tcofn.stat().st_size // (hd["size_record"] * d_bytes) > done:
+            for iono in iter_tra(path, start=done):
+                done += 1
+                yield iono
+            tlast = monotonic()
+        elif timeout is not None and monotonic() - tlast >= timeout:
+            return
+        else:
+            sleep(interval)
+
+
+def follow_excrates(kinfn: Path, interval: float = 1.0, timeout: float = None) -> Iterator[xarray.Dataset]:
+    """
+    yield each new time step of emissions.dat as the simulation writes it
+
+    Parameters
+    ----------
+    kinfn: path to emissions.dat
+    interval: seconds between polls of the file size
+    timeout: stop after this many seconds without a new time step. None: follow forever.
+
+    The byte offset of the end of the last complete time step is kept, so each poll
+    reads only what was appended since.
+    A time step is complete when all of its excrecordlines() lines are newline-terminated,
+    the excitation and the precipitation blocks each ending with a possibly short line.
+    """
+    kinfn = Path(kinfn).expanduser()
+
+    nlines = None
+    offset = 0  # byte offset of first time step not yet yielded
+    tlast = monotonic()
+
+    while True:
+        size = kinfn.stat().st_size if kinfn.is_file() else 0
+
+        if nlines is None and size > 0:
+            with kinfn.open("rb") as f:
+                if f.readline().endswith(b"\n"):
+                    _, nalt, nen, _, _, _, ndat, Nprecip = initparams(kinfn)
+                    nlines = excrecordlines(ndat, Nprecip)
+
+        buf = b""
+        if nlines is not None and size > offset:
+            with kinfn.open("rb") as f:
+                f.seek(offset)
+                buf = f.read(size - offset)
+
+        newline = np.flatnonzero(np.frombuffer(buf, np.uint8) == ord("\n"))
+        n_t = newline.size // nlines if nlines else 0
+
+        if n_t > 0:
+            end = newline[n_t * nlines - 1] + 1
+            dstream = textfloats(buf[:end], kinfn)
+            offset += end
+
+            rates = parseexcrates(dstream, nalt, nen, ndat, Nprecip)
+            for i in range(rates.time.size):
+                yield rates.isel(time=i)
+            tlast = monotonic()
+        elif timeout is not None and monotonic() - tlast >= timeout:
+            return
+        else:
+            sleep(interval)
@@ -0,0 +1,174 @@
+"""
+opt-in instrumentation of the readers:
+wall time, bytes read, records decoded and peak allocation of each phase of read_tra(), loopread(), readexcrates(), readmsis()
+
+    with Instrument(log=True, metrics="transcarread.prom") as inst:
+        iono = read_tra(path)
+
+    inst.results["read_tra"]["decode"]["seconds"]
+
+Outside an Instrument context the hooks do nothing.
+Phases may nest, e.g. "total" contains all the phases of one call.
+Peak allocation is from tracemalloc, relative to the allocation at the start of the phase.
+It is exact for Python >= 3.9, for older Python it is the peak since the Instrument context started.
+"""
+from pathlib import Path
+from contextlib import contextmanager
+import contextvars
+import functools
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+_active: contextvars.ContextVar = contextvars.ContextVar("transcarread_instrument", default=None)
+_func: contextvars.ContextVar = contextvars.ContextVar("transcarread_function", default="")
+
+FIELDS = ("calls", "seconds", "bytes", "records", "peak_bytes")
+
+
+class Instrument:
+    """
+    Parameters
+    ----------
+    log: log each phase at logging.INFO on exit
+    metrics: on exit, write results to this file in Prometheus text format, e.g. for the node_exporter textfile collector
+    callback: called as callback(function, phase, record) at the end of each phase, record being that call only
+    tracemem: trace allocations with tracemalloc for peak_bytes. This slows allocation-heavy code.
+
+    results: {function: {phase: {"calls", "seconds", "bytes", "records", "peak_bytes"}}}, totals over all calls
+    """
+
+    def __init__(
+        self,
+        log: bool = False,
+        metrics: Path = None,
+        callback: Callable[[str, str, Dict[str, Any]], None] = None,
+        tracemem: bool = True,
+    ):
+        self.log = log
+        self.metrics = Path(metrics).expanduser() if metrics else None
+        self.callback = callback
+        self.tracemem = tracemem
+
+        self.results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._stack: List[Dict[str, Any]] = []
+
+    def __enter__(self) -> "Instrument":
+        self._token = _active.set(self)
+        self._trace = self.tracemem and not tracemalloc.is_tracing()
+        if self._trace:
+            tracemalloc.start()
+
+        return self
+
+    def __exit__(self, *exc):
+        _active.reset(self._token)
+        if self._trace:
+            tracemalloc.stop()
+
+        if self.log:
+            for func, name, r in self.rows():
+                logging.info(
+                    f"{func} {name}: {r['calls']} calls {r['seconds']:.4f} s {r['bytes']} bytes "
+                    f"{r['records']} records {r['peak_bytes']} bytes peak"
+                )
+        if self.metrics:
+            self.write(self.metrics)
+
+    def rows(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """(function, phase, totals) of each phase recorded"""
+        for func, phases in self.results.items():
+            for name, r in phases.items():
+                yield func, name, r
+
+    def write(self, fn: Path):
+        """write results in Prometheus text exposition format, replacing fn atomically"""
+        fn = Path(fn).expanduser()
+
+        lines = []
+        for field in FIELDS:
+            metric = f"transcarread_phase_{field}"
+            lines.append(f"# TYPE {metric} gauge")
+            for func, name, r in self.rows():
+                lines.append(f'{metric}{{function="{func}",phase="{name}"}} {r[field]}')
+
+        with tempfile.NamedTemporaryFile("w", dir=fn.parent, delete=False) as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f.name, fn)
+
+    def _push(self, name: str) -> Dict[str, Any]:
+        cur, peak = self._traced()
+        if self._stack:
+            self._stack[-1]["maxmem"] = max(self._stack[-1]["maxmem"], peak)
+        if hasattr(tracemalloc, "reset_peak") and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+        frame = {"func": _func.get(), "phase": name, "tic": time.perf_counter(), "mem0": cur, "maxmem": cur}
+        frame["counts"] = {"bytes": 0, "records": 0}
+        self._stack.append(frame)
+
+        return frame
+
+    def _pop(self, frame: Dict[str, Any]):
+        seconds = time.perf_counter() - frame["tic"]
+        maxmem = max(frame["maxmem"], self._traced()[1])
+
+        self._stack.remove(frame)
+        if self._stack:
+            self._stack[-1]["maxmem"] = max(self._stack[-1]["maxmem"], maxmem)
+
+        r = {"calls": 1, "seconds": seconds, **frame["counts"], "peak_bytes": maxmem - frame["mem0"]}
+
+        tot = self.results.setdefault(frame["func"], {}).setdefault(frame["phase"], dict.fromkeys(FIELDS, 0))
+        for k in ("calls", "seconds", "bytes", "records"):
+            tot[k] += r[k]
+        tot["peak_bytes"] = max(tot["peak_bytes"], r["peak_bytes"])
+
+        if self.callback is not None:
+            self.callback(frame["func"], frame["phase"], r)
+
+    @staticmethod
+    def _traced() -> Tuple[int, int]:
+        return tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[Dict[str, int]]:
+    """
+    record a phase of the instrumented function running, if any.
+    The caller adds to "bytes" and "records" of the dict yielded.
+    """
+    inst = _active.get()
+    if inst is None or not _func.get():
+        yield {"bytes": 0, "records": 0}
+        return
+
+    frame = inst._push(name)
+    try:
+        yield frame["counts"]
+    finally:
+        inst._pop(frame)
+
+
+def instrumented(func: Callable) -> Callable:
+    """
+    decorator: phases within func are recorded under its name, and the whole call as phase "total".
+    When called from another instrumented function, the phases are recorded under the outer function.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active.get() is None or _func.get():
+            return func(*args, **kwargs)
+
+        token = _func.set(func.__name__)
+        try:
+            with phase("total"):
+                return func(*args, **kwargs)
+        finally:
+            _func.reset(token)
+
+    return wrapper
@@ -1,8 +1,12 @@
 from pathlib import Path
+from collections import OrderedDict
 from typing import Dict, Any, Tuple
 from datetime import datetime, timedelta
 import numpy as np
 
+NKEEP = 256  # files whose time index is kept, the least recently used is dropped first
+_tratimes: "OrderedDict[str, Tuple[Tuple[int, int], np.ndarray]]" = OrderedDict()  # record times by path, with size, mtime
+
 
 def parseionoheader(h: np.ndarray) -> Dict[str, Any]:
     """
@@ -59,7 +63,56 @@ def parseionoheader(h: np.ndarray) -> Dict[str, Any]:
     # h[37] last non-zero value till h[59], then zeros till start of data at byte 504
     # h[59] has value of 1.0
 
-    hd["htime"] = datetime(year=h[2], month=h[3], day=h[4], hour=h[5], minute=h[6], second=h[7])
+    hd["htime"] = datetime(*h[2:8].astype(int))
+
+    return hd
+
+
+def parseionoheaders(h: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    vectorized parseionoheader() of many record headers at once
+
+    h: n_t x nhead headers
+    returns: a vector of n_t values for each key of parseionoheader(), with "time" as datetime64[ns] instead of "htime"
+    """
+    h = np.atleast_2d(h)
+
+    checks = {
+        "month": (1 <= h[:, 3]) & (h[:, 3] <= 12),
+        "day": (1 <= h[:, 4]) & (h[:, 4] <= 31),
+        "hour": (0 <= h[:, 5]) & (h[:, 5] < 24),
+        "minute": (0 <= h[:, 6]) & (h[:, 6] < 60),
+        "second": (0 <= h[:, 7]) & (h[:, 7] < 60),
+        "nx": (h[:, 0] > 0) & (h[:, 0] == h[0, 0]),
+        "ncol": (h[:, 1] > 0) & (h[:, 1] == h[0, 1]),
+    }
+    for k, ok in checks.items():
+        if not ok.all():
+            i = np.flatnonzero(~ok)
+            raise ValueError(f"header {k} of {i.size} records is invalid, first at record {i[0]}. Is this a transcar_output file?")
+
+    hd = {
+        "nx": h[:, 0].astype(int),
+        "ncol": h[:, 1].astype(int),
+        "intpas": h[:, 8],
+        "longeo": h[:, 9],
+        "latgeo": h[:, 10],
+        "lonmag": h[:, 11],
+        "latmag": h[:, 12],
+        "tmag": h[:, 13],
+        "f1072": h[:, 14],
+        "f1073": h[:, 15],
+        "ap2": h[:, 16],
+        "ikp": h[:, 17],
+        "dTinf": h[:, 18],
+        "dUinf": h[:, 19],
+        "cofo": h[:, 20],
+        "cofh": h[:, 21],
+        "cofn": h[:, 22],
+        "chi": h[:, 23],
+        "approx": h[:, 36],
+        "time": ionoheadtime(h),
+    }
 
     return hd
 
@@ -77,6 +130,74 @@ def readionoheader(tcofn: Path, nhead: int) -> Tuple[Dict[str, Any], np.ndarray]
     return parseionoheader(h), h
 
 
+def ionorecord(hd: Dict[str, Any]) -> np.dtype:
+    """
+    structured dtype of one transcar_output time step:
+    header block of size_head floats, then nx x ncol block of data
+    """
+    return np.dtype([("head", np.float32, (hd["size_head"],)), ("data", np.float32, (hd["nx"], hd["ncol"]))])
+
+
+def ionoheadtime(h: np.ndarray) -> np.ndarray:
+    """
+    vectorized header time: h[..., 2:8] is year, month, day, hour, minute, second
+    """
+    ymdhms = np.asarray(h[..., 2:8]).astype(int)
+
+    month = (ymdhms[..., 0] - 1970) * 12 + ymdhms[..., 1] - 1
+    day = month.astype("datetime64[M]").astype("datetime64[D]") + (ymdhms[..., 2] - 1)
+    sec = ymdhms[..., 3] * 3600 + ymdhms[..., 4] * 60 + ymdhms[..., 5]
+
+    return day.astype("datetime64[ns]") + sec.astype("timedelta64[s]")
+
+
+def headnx(h: np.ndarray, nx: int) -> np.ndarray:
+    """update header(s) h[..., :] with a new number of altitudes, the only header field that changes on regridding"""
+    h[..., 0] = nx
+
+    return h
+
+
+def tratimes(tcofn: Path, hd: Dict[str, Any]) -> np.ndarray:
+    """
+    time of each record of transcar_output, without reading the data blocks.
+    The record headers are read by a strided view of the memory-mapped file.
+    The times are kept for reuse until the file changes, one array per file, for the NKEEP files last used.
+    """
+    tcofn = Path(tcofn).expanduser()
+    stat = tcofn.stat()
+    key = str(tcofn.resolve())
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    t = recallindex(_tratimes, key, stamp)
+    if t is not None:
+        return t
+
+    n_t = stat.st_size // (hd["size_record"] * 4)
+
+    rec = np.memmap(tcofn, dtype=ionorecord(hd), mode="r", shape=(n_t,))
+    t = ionoheadtime(rec["head"][:, :8])
+    keepindex(_tratimes, key, stamp, t)
+
+    return t
+
+
+def recallindex(cache: "OrderedDict[str, Tuple[Tuple[int, int], Any]]", key: str, stamp: Tuple[int, int]) -> Any:
+    """value kept in cache for key if made with this stamp of the file, else None"""
+    if key not in cache or cache[key][0] != stamp:
+        return None
+    cache.move_to_end(key)
+
+    return cache[key][1]
+
+
+def keepindex(cache: "OrderedDict[str, Tuple[Tuple[int, int], Any]]", key: str, stamp: Tuple[int, int], value: Any):
+    """keep value for key, replacing that of an older stamp, and drop the least recently used beyond NKEEP"""
+    cache[key] = (stamp, value)
+    cache.move_to_end(key)
+    while len(cache) > NKEEP:
+        cache.popitem(last=False)
+
+
 def readTranscarInput(infn: Path) -> Dict[str, Any]:
     """
     The transcar input file is indexed by line number --this is what the Fortran
@@ -0,0 +1,113 @@
+"""
+lazy, dask-backed Datasets chunked along time, for output larger than RAM.
+Each chunk is read from disk only when computed.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+import numpy as np
+import xarray
+import dask
+import dask.array as da
+
+from . import (
+    readionoheader,
+    parseionoheader,
+    ionorecord,
+    tratimes,
+    excratesindex,
+    initparams,
+    readexcstream,
+    parseexcrates,
+    plasmaparam,
+    ppindex,
+    ppavailable,
+    selectparams,
+    altslice,
+    _dextind,
+    PARAM,
+    NumPerRow,
+    d_bytes,
+)
+
+
+def lazyread(
+    tcofn: Path,
+    hd: Dict[str, Any],
+    chunks: int,
+    alt_range: Sequence[float] = None,
+    params: Sequence[str] = None,
+    dtype: Any = None,
+) -> xarray.Dataset:
+    """
+    lazy equivalent of memmapread(): only the record header times and the first record are read now.
+    pp is computed per chunk from the iono chunk.
+    Each chunk reads only the altitudes in alt_range and the columns in params.
+    dtype: of iono and pp, None: iono float32 as stored, pp float64
+    """
+    tcofn = Path(tcofn).expanduser()
+    n_t = tcofn.stat().st_size // hd["size_record"] // d_bytes
+
+    t = tratimes(tcofn, hd)
+    h0, hraw = readionoheader(tcofn, hd["size_head"])
+    approx = h0["approx"]
+    params = selectparams(params, PARAM)
+    dextind = [_dextind(approx)[PARAM.index(q)] for q in params]
+    which = ppavailable(params)
+    alt = np.fromfile(tcofn, np.float32, hd["nx"] * hd["ncol"], offset=hd["size_head"] * d_bytes)[:: hd["ncol"]]
+    rows = altslice(alt, alt_range)
+    alt = alt[rows]
+
+    blocks: List[da.Array] = []
+    for i0 in range(0, n_t, chunks):
+        i1 = min(i0 + chunks, n_t)
+        blocks.append(
+            da.from_delayed(
+                dask.delayed(_trachunk)(tcofn, hd, i0, i1, dextind, rows, dtype),
+                shape=(i1 - i0, alt.size, len(params)),
+                dtype=dtype or np.float32,
+            )
+        )
+    data = da.concatenate(blocks, axis=0)
+
+    ppdtype = dtype or float
+    pp = da.map_blocks(
+        plasmaparam, data, ppindex(params), approx, which, ppdtype, dtype=ppdtype, chunks=data.chunks[:2] + ((len(which),),)
+    )
+
+    attrs = {"filename": str(tcofn)}
+    coords = [("time", t), ("alt_km", alt)]
+    iono = xarray.DataArray(data, coords=coords + [("isrparam", params)], attrs=attrs)
+    pp = xarray.DataArray(pp, coords=coords + [("isrparam", which)], attrs=attrs)
+
+    return xarray.Dataset({"iono": iono, "pp": pp}, attrs={"chi": parseionoheader(hraw)["chi"]})
+
+
+def _trachunk(
+    tcofn: Path, hd: Dict[str, Any], i0: int, i1: int, dextind: List[int], rows: slice = slice(None), dtype: Any = None
+) -> np.ndarray:
+    rec = np.memmap(tcofn, dtype=ionorecord(hd), mode="r", offset=i0 * hd["size_record"] * d_bytes, shape=(i1 - i0,))
+
+    return np.asarray(rec["data"][:, rows][:, :, dextind], dtype=dtype)
+
+
+def lazyexcrates(kinfn: Path, chunks: int, dtype: Any = float) -> xarray.Dataset:
+    """
+    lazy equivalent of readexcrates(): only the record index and the last time step are parsed now
+    """
+    index = excratesindex(kinfn)
+    kinfn, nalt, nen, dipangle, ctime, ndatrow, ndat, Nprecip = initparams(kinfn)
+    n_t = index["time"].size
+    size_record = NumPerRow + ndat + Nprecip
+
+    last = parseexcrates(readexcstream(kinfn, n_t - 1, n_t, dtype), nalt, nen, ndat, Nprecip, t=index["time"][-1:])
+
+    blocks = [
+        da.from_delayed(
+            dask.delayed(readexcstream)(kinfn, i0, min(i0 + chunks, n_t), dtype),
+            shape=(min(i0 + chunks, n_t) - i0, size_record),
+            dtype=dtype,
+        )
+        for i0 in range(0, n_t, chunks)
+    ]
+
+    return parseexcrates(da.concatenate(blocks, axis=0), nalt, nen, ndat, Nprecip, t=index["time"], alt=last.alt_km.values)
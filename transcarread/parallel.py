@@ -0,0 +1,72 @@
+"""
+parse one emissions.dat on many CPU cores.
+Every time step has the same number of values, so the file is split at the time step boundaries of excratesindex(),
+and each worker process parses its byte range straight into its rows of one shared output array.
+Each number is converted by the same readfloats() as the serial parser, so the values are bit-identical.
+
+The output is a numpy.memmap of a temporary file that the workers map too, returned as is,
+so the values are in memory once. The temporary file is in the directory of emissions.dat by default,
+which has room for its text, so also for its values, unlike a small or RAM-backed /tmp.
+On POSIX the file is removed as soon as the workers are done; the mapping stays valid until the array is freed.
+"""
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
+import tempfile
+from typing import Any, Tuple
+import numpy as np
+
+from . import excratesindex, initparams, readfloats, NumPerRow
+
+TASKS_PER_WORKER = 4  # smaller ranges than one per worker, to balance uneven parse speed
+
+
+def parexcstream(kinfn: Path, workers: int = None, dtype: Any = float, tmpdir: Path = None) -> Tuple[np.ndarray, int]:
+    """
+    values of all complete time steps of emissions.dat, one row per time step, as readexcstream()
+
+    workers: number of processes. None: one per CPU
+    tmpdir: directory of the temporary file the values are mapped from. None: the directory of kinfn
+
+    returns: values, and count of numbers parsed
+    """
+    kinfn = Path(kinfn).expanduser()
+    index = excratesindex(kinfn)
+    ndat, Nprecip = initparams(kinfn)[6:8]
+
+    shape = (index["time"].size, NumPerRow + ndat + Nprecip)
+    dtype = np.dtype(dtype)
+    workers = workers or os.cpu_count() or 1
+    bounds = np.linspace(0, shape[0], min(shape[0], workers * TASKS_PER_WORKER) + 1).astype(int)
+
+    if shape[0] == 0:
+        return np.empty(shape, dtype), 0
+
+    fd, tmp = tempfile.mkstemp(suffix=".dstream", dir=Path(tmpdir).expanduser() if tmpdir else kinfn.parent)
+    os.close(fd)
+    try:
+        dstream = np.memmap(tmp, dtype, "w+", shape=shape)
+        with ProcessPoolExecutor(max_workers=workers) as exe:
+            futures = [
+                exe.submit(_parserange, kinfn, tmp, shape, dtype, i0, i1, index["start"][i0], index["end"][i1 - 1])
+                for i0, i1 in zip(bounds[:-1], bounds[1:])
+            ]
+            n = sum(f.result() for f in futures)
+        if os.name == "nt":  # a mapped file cannot be removed on Windows
+            dstream = np.array(dstream)
+    finally:
+        os.remove(tmp)
+
+    return dstream, n
+
+
+def _parserange(kinfn: Path, tmp: str, shape: Tuple[int, int], dtype: np.dtype, i0: int, i1: int, start: int, end: int) -> int:
+    """parse bytes start <= b < end of kinfn, time steps i0 <= i < i1, into rows i0:i1 of the memmap of file tmp"""
+    mm = np.memmap(tmp, dtype, "r+", shape=shape)
+    with kinfn.open("rb") as f:
+        f.seek(start)
+        n = readfloats(f, mm[i0:i1].reshape(-1), end - start)
+    mm.flush()
+    del mm
+
+    return n
@@ -9,6 +9,7 @@ from matplotlib.colors import LogNorm
 from . import ISRPARAM
 
 sfmt = None
+DENSITIES = ("n1", "n2", "n3", "n4", "n5", "n6")  # plotted by plot_isr(verbose=True)
 
 
 def timelbl(time, ax, tctime):
@@ -41,32 +42,33 @@ def plot_isr(iono: xarray.Dataset, infile: Path, tctime: dict, plot_params: list
 
         _plot1d(dat, alt, p, infile, tctime, time[-1])
 
-        if p == "ne":
-            cn = LogNorm()
-        else:
-            cn = None
-        if p == "vi":
-            vmax = abs(dat).max()
-            vmin = -vmax
-            cmap = "bwr"
-        else:
-            cmap = "cubehelix"
-            vmin = vmax = None
-
         if time.size > 5:
             fg = figure()
             ax = fg.gca()
-            pcm = ax.pcolormesh(time, alt, dat.values.T, cmap=cmap, norm=cn, vmin=vmin, vmax=vmax)
+            pcm = ax.pcolormesh(time, alt, dat.values.T, **_style(p, dat.values))
             _tplot(time, tctime, fg, ax, pcm, p, infile)
     # %% ionosphere state parameters
     if verbose:
-        for ind in ("n1", "n2", "n3", "n4", "n5", "n6"):
+        for ind in DENSITIES:
             fg = figure()
             ax = fg.gca()
-            pcm = ax.pcolormesh(time, alt, iono[ind].values, cmap=cmap, norm=LogNorm(), vmin=0.1, vmax=1e12)
+            pcm = ax.pcolormesh(time, alt, iono["iono"].loc[..., ind].values.T, **_style(ind))
             _tplot(time, tctime, fg, ax, pcm, str(ind), infile)
 
 
+def _style(p: str, dat: np.ndarray = None) -> dict:
+    """pcolormesh colormap and normalization of parameter p with values dat"""
+    if p == "ne":
+        return {"cmap": "cubehelix", "norm": LogNorm()}
+    if p == "vi":
+        vmax = np.nanmax(abs(dat))
+        return {"cmap": "bwr", "vmin": -vmax, "vmax": vmax}
+    if p in DENSITIES:
+        return {"cmap": "cubehelix", "norm": LogNorm(vmin=0.1, vmax=1e12)}
+
+    return {"cmap": "cubehelix"}
+
+
 def _tplot(t, tctime: dict, fg, ax, pcm, ttxt: str, infile: Path):
     # ax.autoscale(True, tight=True)
     ax.set_xlabel("time [UTC]")
@@ -0,0 +1,106 @@
+"""
+linear interpolation of altitude profiles to new altitude grids.
+All columns, and all target grids, are interpolated together from one set of precomputed weights.
+
+    grids = [newgrid(z, 2.0, "linear"), newgrid(z, 0.1, "incr")]
+    msis2, msis01 = regrid(readmsis(ifn), grids)
+"""
+from typing import Sequence, Tuple, List, Union
+import numpy as np
+import xarray
+
+from .ztanh import setupz
+
+METHODS = ("linear", "incr", "tanh")
+
+
+def newgrid(z: np.ndarray, dz, method: str) -> np.ndarray:
+    """
+    altitude grid [km] spanning source grid z
+
+    linear: spacing dz[0]
+    incr: spacing dz[0] at bottom, increasing by dz[0] each cell
+    tanh: z.size cells, from ztanh.setupz() with gridmin, gridmax = dz[0], dz[1]
+    """
+    z = np.asarray(z, dtype=float)
+    dz = np.atleast_1d(dz).astype(float)
+    method = method.lower()
+
+    if method == "linear":
+        znew = np.arange(z[0], z[-1], dz[0], dtype=float)
+    elif method == "incr":
+        # cell k is at z0 + dz (1 + 2 + ... + k), below top of z
+        kmax = int(np.sqrt(2 * (z[-1] - z[0]) / dz[0])) + 1
+        k = np.arange(kmax + 1)
+        znew = z[0] + dz[0] * k * (k + 1) / 2
+        znew = znew[znew < z[-1]]
+    elif method == "tanh":
+        znew = setupz(z.size, z[0], dz[0], dz[1])
+    else:
+        raise ValueError(f"unknown altitude grid method {method}, choose from {METHODS}")
+
+    return znew
+
+
+def weights(z: np.ndarray, znew: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    index of the source cell below each new altitude, and the fractional distance to the cell above.
+    z must be increasing, and znew within z.
+    """
+    z = np.asarray(z, dtype=float)
+    znew = np.asarray(znew, dtype=float)
+
+    if znew.min() < z[0] or znew.max() > z[-1]:
+        raise ValueError(f"new altitudes {znew.min():.1f} .. {znew.max():.1f} km are outside {z[0]:.1f} .. {z[-1]:.1f} km")
+
+    i = np.clip(np.searchsorted(z, znew, side="right") - 1, 0, z.size - 2)
+    w = (znew - z[i]) / (z[i + 1] - z[i])
+
+    return i, w
+
+
+def interp(d: np.ndarray, i: np.ndarray, w: np.ndarray, axis: int = 0) -> np.ndarray:
+    """interpolate d along axis with weights from weights()"""
+    d = np.asarray(d)
+    axis = axis % d.ndim
+    w = w.reshape((-1,) + (1,) * (d.ndim - axis - 1))
+
+    dtype = np.result_type(d.dtype, w.dtype)  # float32 data is interpolated in float64, as by interp1d
+    lo = d.take(i, axis).astype(dtype, copy=False)
+
+    return lo + w * (d.take(i + 1, axis) - lo)
+
+
+def regridarray(d: np.ndarray, z: np.ndarray, grids: Sequence[np.ndarray], axis: int = 0) -> List[np.ndarray]:
+    """interpolate d from altitudes z along axis to each of grids, in one pass over d"""
+    i, w = weights(z, np.concatenate(grids))
+
+    return np.split(interp(d, i, w, axis), np.cumsum([g.size for g in grids])[:-1], axis)
+
+
+def regrid(
+    data: Union[xarray.Dataset, xarray.DataArray], grids: Sequence[np.ndarray]
+) -> List[Union[xarray.Dataset, xarray.DataArray]]:
+    """
+    interpolate every variable with an alt_km dimension to each of grids.
+    data is from readmsis(), readinitconddat(), read_tra() or compplasmaparam(), any leading dims such as time are kept.
+    """
+    z = data.alt_km.values
+    i, w = weights(z, np.concatenate(grids))
+    splits = np.cumsum([g.size for g in grids])[:-1]
+
+    def _regrid(da: xarray.DataArray) -> List[xarray.DataArray]:
+        if "alt_km" not in da.dims:
+            return [da] * len(grids)
+        axis = da.get_axis_num("alt_km")
+        return [
+            xarray.DataArray(v, dims=da.dims, coords={**da.drop_vars("alt_km").coords, "alt_km": g}, attrs=da.attrs)
+            for v, g in zip(np.split(interp(da.values, i, w, axis), splits, axis), grids)
+        ]
+
+    if isinstance(data, xarray.DataArray):
+        return _regrid(data)
+
+    out = {k: _regrid(v) for k, v in data.data_vars.items()}
+
+    return [xarray.Dataset({k: v[j] for k, v in out.items()}, attrs=data.attrs) for j in range(len(grids))]
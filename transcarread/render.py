@@ -0,0 +1,151 @@
+"""
+off-screen rendering of the plot_isr() time-altitude images to PNG, for batch reports of long runs.
+Each image is decimated along time to the pixel width of its axes before drawing,
+and drawn on an Agg canvas not managed by pyplot, so no window opens and many can be made in parallel processes.
+
+    render_beams(sorted(Path("~/sims").expanduser().glob("beam*")), "report", jobs=8)
+"""
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+import xarray
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from . import read_tra, readTranscarInput, PPINPUTS, ISRPARAM
+from .plots import _tplot, _style, DENSITIES
+
+DECIMATE = ("minmax", "mean")
+
+
+def decimate(t: np.ndarray, dat: np.ndarray, width: int, how: str = "minmax") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    reduce time x ... dat to about width time steps, e.g. the pixel width of the plot
+
+    minmax: the minimum and the maximum of each of width // 2 bins, so peaks stay visible
+    mean: the mean of each of width bins
+    NaN are ignored, as by nanmin(), nanmax(), nanmean()
+    """
+    if how not in DECIMATE:
+        raise ValueError(f"unknown decimation {how}, choose from {DECIMATE}")
+
+    if t.size <= width:
+        return t, dat
+
+    nbin = max(width // 2 if how == "minmax" else width, 1)
+
+    start = np.linspace(0, t.size, nbin, endpoint=False).astype(int)
+    mid = start + np.diff(np.append(start, t.size)) // 2
+
+    if how == "minmax":
+        lo = np.fmin.reduceat(dat, start, axis=0)
+        hi = np.fmax.reduceat(dat, start, axis=0)
+        # minimum at bin start, maximum at bin middle, interleaved
+        tt = np.stack((t[start], t[mid]), axis=1).reshape(-1)
+        return tt, np.stack((lo, hi), axis=1).reshape((-1,) + dat.shape[1:])
+
+    ok = ~np.isnan(dat)
+    with np.errstate(invalid="ignore"):
+        mean = np.add.reduceat(np.where(ok, dat, 0), start, axis=0) / np.add.reduceat(ok, start, axis=0)
+
+    return t[mid], mean
+
+
+def render(
+    t: np.ndarray,
+    alt: np.ndarray,
+    dat: np.ndarray,
+    name: str,
+    infile: Path,
+    tctime: Dict[str, Any],
+    ofn: Path,
+    size: Tuple[float, float] = (10, 5),
+    dpi: int = 100,
+    how: str = "minmax",
+) -> Path:
+    """
+    draw time x alt dat as by plot_isr() and write to PNG ofn
+
+    size: figure size [inches]
+    """
+    fg = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(fg)
+    ax = fg.add_subplot()
+
+    style = _style(name, dat)
+    width = int(ax.get_window_extent().width)
+    t, dat = decimate(t, dat, width, how)
+
+    pcm = ax.pcolormesh(t, alt, dat.T, **style)
+    _tplot(t, tctime, fg, ax, pcm, name, infile)
+
+    ofn = Path(ofn).expanduser()
+    ofn.parent.mkdir(parents=True, exist_ok=True)
+    fg.savefig(ofn)
+
+    return ofn
+
+
+def render_isr(
+    iono: xarray.Dataset,
+    infile: Path,
+    tctime: dict,
+    outdir: Path,
+    plot_params: Sequence[str] = None,
+    verbose: bool = False,
+    **kwargs,
+) -> List[Path]:
+    """
+    the time-altitude images of plot_isr(iono, infile, tctime, plot_params, verbose), written to outdir/<param>.png
+
+    kwargs: of render()
+    """
+    time = iono.time.values.astype("datetime64[us]")
+    alt = iono.alt_km.values
+    outdir = Path(outdir).expanduser()
+
+    images = [("pp", p) for p in ISRPARAM if not plot_params or p in plot_params]
+    if verbose:
+        images += [("iono", p) for p in DENSITIES]
+
+    return [
+        render(time, alt, iono[v].loc[..., p].values, p, infile, tctime, outdir / f"{p}.png", **kwargs)
+        for v, p in images
+        if p in iono[v].isrparam
+    ]
+
+
+def render_beams(
+    paths: Sequence[Path], outdir: Path, plot_params: Sequence[str] = None, verbose: bool = False, jobs: int = None, **kwargs
+) -> List[Path]:
+    """
+    render_isr() of many runs, one image per process. Each process reads only the columns its image needs.
+
+    paths: directories above dir.output/, e.g. beam* directories
+    outdir: images are written to outdir/<directory name>/<param>.png
+    jobs: number of processes. 1 renders serially. None: one per CPU
+    kwargs: of render()
+
+    returns: filenames written
+    """
+    params = [p for p in ISRPARAM if not plot_params or p in plot_params] + (list(DENSITIES) if verbose else [])
+    tasks = [(Path(d).expanduser(), p, Path(outdir).expanduser() / Path(d).name / f"{p}.png") for d in paths for p in params]
+
+    if jobs == 1:
+        return [_render_run(*t, **kwargs) for t in tasks]
+
+    with ProcessPoolExecutor(max_workers=jobs) as exe:
+        futures = [exe.submit(_render_run, *t, **kwargs) for t in tasks]
+        return [f.result() for f in futures]
+
+
+def _render_run(path: Path, p: str, ofn: Path, **kwargs) -> Path:
+    """read just what parameter p of run path needs, and render it"""
+    dat = read_tra(path, params=PPINPUTS.get(p, [p]))
+    v = "pp" if p in ISRPARAM else "iono"
+    tctime = readTranscarInput(path / "dir.input/DATCAR")
+
+    return render(
+        dat.time.values.astype("datetime64[us]"), dat.alt_km.values, dat[v].loc[..., p].values, p, path, tctime, ofn, **kwargs
+    )
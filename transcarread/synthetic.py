@@ -0,0 +1,187 @@
+"""
+write valid synthetic Transcar files of any size, for benchmarks and tests
+without real simulation output.
+The values are smooth made-up profiles with noise, not physics.
+
+    make_run(root, nbeam=10, n_t=600, nx=286)
+"""
+from pathlib import Path
+from datetime import datetime, timedelta
+import numpy as np
+
+from . import nhead, headbytes, d_bytes, NdataCol, REACTION
+from .writers import excformat
+
+ncol_tra = nhead // 2  # readers assume header length 2 * ncol = nhead
+
+
+def _header(size_head: int, nx: int, ncol: int, t: datetime, approx: int) -> np.ndarray:
+    """header block as parsed by parseionoheader()"""
+    h = np.zeros(size_head, np.float32)
+    h[:8] = (nx, ncol, t.year, t.month, t.day, t.hour, t.minute, t.second)
+    h[8:24] = (600, -147.43, 65.12, 263.2, 65.47, 22.0, 150, 150, 4, 0, 0, 0, 1, 1, 1, 110.4)
+    h[36] = approx
+    h[59] = 1.0
+
+    return h
+
+
+def _profiles(rng: np.random.Generator, alt: np.ndarray, ncol: int) -> np.ndarray:
+    """nx x ncol state: altitude, then densities, velocities, temperatures, other"""
+    nx = alt.size
+    z = (alt - alt[0])[:, None]
+
+    data = rng.uniform(-1, 1, (nx, ncol)).astype(np.float32)
+    data[:, 0] = alt
+    data[:, 1:7] = 1e11 * np.exp(-z / rng.uniform(50, 500, 6)) * rng.uniform(0.9, 1.1, (nx, 6))  # n1..n6
+    data[:, 7:13] = rng.normal(0, 50, (nx, 6))  # v1..v3, vm, ve
+    data[:, 13:22] = 200 + 2 * z + rng.uniform(0, 10, (nx, 9))  # temperatures
+    if ncol > 49:
+        data[:, 49] = 1e8 * np.exp(-z[:, 0] / 100)  # n7
+
+    return data
+
+
+def altgrid(nx: int, zmin: float = 90.0, zmax: float = 3000.0) -> np.ndarray:
+    """altitude grid [km], spacing increasing with altitude like Transcar grids"""
+    return (zmin + (zmax - zmin) * np.linspace(0, 1, nx) ** 1.5).astype(np.float32)
+
+
+def make_tra(
+    fn: Path, n_t: int, nx: int = 286, t0: datetime = datetime(2013, 3, 31, 9), dt: float = 1.0, approx: int = 13, seed: int = 0
+) -> Path:
+    """
+    write dir.output/transcar_output: n_t time steps of nx altitudes, dt seconds apart
+
+    The file is written one time step at a time, so it may be larger than RAM.
+    """
+    fn = Path(fn).expanduser()
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    alt = altgrid(nx)
+    base = _profiles(rng, alt, ncol_tra)
+
+    with fn.open("wb") as f:
+        for i in range(n_t):
+            t = t0 + timedelta(seconds=round(i * dt))
+            _header(nhead, nx, ncol_tra, t, approx).tofile(f)
+            data = base.copy()
+            data[:, 1:] *= np.float32(1 + 0.5 * np.sin(i / 50))
+            data.tofile(f)
+
+    return fn
+
+
+def make_msis(fn: Path, nx: int = 286, ncol: int = ncol_tra, approx: int = 13, seed: int = 0) -> Path:
+    """write initial conditions file such as dir.input/90kmmaxpt123.dat, as read by readmsis()"""
+    if not 50 <= ncol <= headbytes // d_bytes // 2:
+        raise ValueError(f"ncol must be in 50..{headbytes // d_bytes // 2}")
+
+    fn = Path(fn).expanduser()
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    with fn.open("wb") as f:
+        _header(2 * ncol, nx, ncol, datetime(1999, 10, 27, 18, 40), approx).tofile(f)
+        _profiles(rng, altgrid(nx), ncol).tofile(f)
+
+    return fn
+
+
+def make_excrates(
+    fn: Path, n_t: int, nalt: int = 123, nen: int = 171, t0: datetime = datetime(2013, 3, 31, 9), dt: float = 1.0, seed: int = 0
+) -> Path:
+    """
+    write dir.output/emissions.dat: n_t time steps of nalt altitudes and nen precipitation energies.
+    With the default nalt and nen, the excitation and precipitation blocks both end with a short line.
+    """
+    fn = Path(fn).expanduser()
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    d = np.empty((nalt, NdataCol))
+    d[:, 0] = altgrid(nalt, zmax=1000)
+    d[:, 1:] = 10 ** rng.uniform(-6, 5, (nalt, len(REACTION)))
+    p = np.column_stack((np.logspace(0, 5, nen), 10 ** rng.uniform(-30, 5, nen)))
+
+    fmt = excformat(d.size, p.size)
+
+    with fn.open("w") as f:
+        for i in range(n_t):
+            t = t0 + timedelta(seconds=i * dt)
+            sec = (t - datetime(t.year, t.month, t.day)).total_seconds()
+            f.write(f"     {t.strftime('%Y%j')}   {sec:.10f}        {12.66167:.5f}             {nalt}         {nen}\n")
+            v = d.copy()
+            v[:, 1:] *= 1 + 0.01 * i  # altitude grid is the same for all time steps
+            f.write(fmt % tuple(np.concatenate((v.ravel(), p.ravel()))))
+
+    return fn
+
+
+def make_datcar(fn: Path, t0: datetime = datetime(2013, 3, 31, 9), duration: float = 60.0):
+    """write dir.input/DATCAR as read by readTranscarInput(), precipitation for the middle third of the run"""
+    fn = Path(fn).expanduser()
+    fn.parent.mkdir(parents=True, exist_ok=True)
+    sec = (t0 - datetime(t0.year, t0.month, t0.day)).total_seconds()
+
+    values = [
+        "2",
+        "conttanh.dat",
+        "1.",
+        "1.",
+        t0.strftime("%Y%j"),
+        f"{sec:.0f}.",
+        f"{duration:.0f}.",
+        "2",
+        "65.12,-147.43",
+        "0.",
+        "0.",
+        "0",
+        "1.",
+        "0.",
+        "126.0",
+        "107.6",
+        "63.6",
+        "25.",
+        "1.",
+        "1.",
+        "1.",
+        "1.",
+        "1.",
+        "-1.e-4",
+        "precinput.dat",
+        "1",
+        "1",
+        f"{sec + duration / 3:.0f}.",
+        f"{sec + 2 * duration / 3:.0f}.",
+    ]
+    fn.write_text("\n".join(v + "\t\t\t\t\tsynthetic" for v in values) + "\n")
+
+    return fn
+
+
+def make_run(
+    root: Path,
+    nbeam: int = 3,
+    n_t: int = 60,
+    nx: int = 286,
+    nalt: int = 123,
+    nen: int = 171,
+    t0: datetime = datetime(2013, 3, 31, 9),
+) -> list:
+    """
+    write a simulation tree root/beam<energy>/dir.input, dir.output for nbeam log-spaced beam energies
+
+    returns: list of beam directories
+    """
+    root = Path(root).expanduser()
+    dirs = []
+    for i, e0 in enumerate(np.logspace(1, 4, nbeam)):
+        d = root / f"beam{e0:.1f}"
+        make_datcar(d / "dir.input/DATCAR", t0, n_t)
+        make_msis(d / "dir.input/90kmmaxpt123.dat", nx, seed=i)
+        make_tra(d / "dir.output/transcar_output", n_t, nx, t0, seed=i)
+        make_excrates(d / "dir.output/emissions.dat", n_t, nalt, nen, t0, seed=i)
+        dirs.append(d)
+
+    return dirs
@@ -0,0 +1,144 @@
+"""
+precomputed store of the excitation rate (VER eigenprofile) of every beam of a simulation, in HDF5.
+calcVERtc() reads from the store instead of parsing emissions.dat when sim.loadver is set.
+
+    writever("~/sims/01Mar2011_FA", sim.loadverfn)
+    rates = calcVERtc(beamdir, tReq, "DATCAR", sim)
+
+The store has dataset "ver" of beam energy x altitude x reaction x time,
+and the coordinates "beam_energy_eV", "alt_km", "reaction", "time" (ns since 1970-01-01).
+Each HDF5 chunk holds all altitudes and reactions of one time step,
+for as many beams as fit in about 1 MB, so reading one time step reads few chunks.
+"""
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from typing import Any, Dict, Tuple
+import numpy as np
+import xarray
+import h5py
+
+from . import readexcrecords, excratesindex, searchtime, REACTION, KINFN
+from .beams import beamdirs, beamenergy
+
+CHUNKBYTES = 2 ** 20
+SLABBYTES = 2 ** 28  # parsed rates held in memory at a time by writever()
+
+_stores: Dict[str, Tuple[Tuple[int, int], h5py.File, Dict[str, np.ndarray]]] = {}  # open stores by path, with size, mtime
+
+
+def writever(root: Path, h5fn: Path, kinfn: str = KINFN, workers: int = None) -> Path:
+    """
+    parse emissions.dat of every beam under root once, into store h5fn.
+    All beams must have the same altitudes and times.
+    Beams are parsed in parallel processes, as many at a time as share an HDF5 chunk,
+    a slab of time steps at a time, so each chunk is written once and about SLABBYTES of rates are in memory.
+
+    workers: number of processes. 1 parses serially. None: one per CPU
+
+    returns: h5fn
+    """
+    dirs = beamdirs(root, kinfn)
+    if not dirs:
+        raise FileNotFoundError(f"no beams found in {root}")
+
+    h5fn = Path(h5fn).expanduser()
+    h5fn.parent.mkdir(parents=True, exist_ok=True)
+    if str(h5fn.resolve()) in _stores:
+        _stores.pop(str(h5fn.resolve()))[1].close()
+
+    t = excratesindex(dirs[0] / kinfn)["time"]
+    alt = readexcrecords(dirs[0] / kinfn, t.size - 1, t.size).alt_km.values
+    shape = (len(dirs), alt.size, len(REACTION), t.size)
+    step = min(len(dirs), max(1, CHUNKBYTES // (alt.size * len(REACTION) * 8)))
+    slab = max(1, SLABBYTES // (step * alt.size * len(REACTION) * 8))
+
+    with h5py.File(h5fn, "w") as f:
+        ver = f.create_dataset("ver", shape, dtype=float, chunks=(step,) + shape[1:3] + (1,))
+        f["beam_energy_eV"] = [beamenergy(d) for d in dirs]
+        f["alt_km"] = alt
+        f["reaction"] = np.array(REACTION, dtype="S")
+        f["time"] = t.astype(np.int64)
+        f["time"].attrs["units"] = "ns since 1970-01-01T00:00:00"
+        for dim, name in zip(ver.dims, ("beam_energy_eV", "alt_km", "reaction", "time")):
+            dim.label = name
+
+        exe = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+        try:
+            for i0 in range(0, len(dirs), step):
+                fns = [d / kinfn for d in dirs[i0: i0 + step]]
+                for k0 in range(0, t.size, slab):
+                    k1 = min(k0 + slab, t.size)
+                    block = np.empty((len(fns),) + shape[1:3] + (k1 - k0,))
+                    slabs = (exe.map if exe else map)(_slab, fns, repeat(k0), repeat(k1))
+                    for j, (fn, exc) in enumerate(zip(fns, slabs)):
+                        if not (np.array_equal(exc.alt_km.values, alt) and np.array_equal(exc.time.values, t[k0:k1])):
+                            raise ValueError(f"{fn}: altitudes or times differ from {dirs[0] / kinfn}")
+                        block[j] = exc.values
+                    ver[i0: i0 + len(fns), :, :, k0:k1] = block
+        finally:
+            if exe is not None:
+                exe.shutdown()
+
+    return h5fn
+
+
+def _slab(kinfn: Path, k0: int, k1: int) -> xarray.DataArray:
+    """excitation rates of time steps k0 <= k < k1 of kinfn, as altitude x reaction x time"""
+    return readexcrecords(kinfn, k0, k1)["excitation"].transpose("alt_km", "reaction", "time")
+
+
+def readver(h5fn: Path, beam_energy: float, tReq: datetime = None) -> xarray.DataArray:
+    """
+    excitation rates of one beam from store h5fn, as ExcitationRates(kinfn, tReq) of that beam
+
+    tReq: optional, only read the time step nearest this time
+    """
+    f, coords = openver(h5fn)
+
+    i = np.flatnonzero(np.isclose(coords["beam_energy_eV"], beam_energy))
+    if i.size == 0:
+        raise ValueError(f"beam {beam_energy} eV is not in {h5fn}")
+
+    if tReq is None:
+        return xarray.DataArray(
+            f["ver"][i[0]].transpose(2, 0, 1),
+            dims=("time", "alt_km", "reaction"),
+            coords={"time": coords["time"], "alt_km": coords["alt_km"], "reaction": REACTION},
+            name="excitation",
+        )
+
+    k = searchtime(coords["time"], tReq)
+    return xarray.DataArray(
+        f["ver"][i[0], :, :, k],
+        dims=("alt_km", "reaction"),
+        coords={"time": coords["time"][k], "alt_km": coords["alt_km"], "reaction": REACTION},
+        name="excitation",
+    )
+
+
+def openver(h5fn: Path) -> Tuple[h5py.File, Dict[str, Any]]:
+    """
+    the store open for reading, and its coordinates.
+    It is kept open for later calls until the file changes.
+    """
+    h5fn = Path(h5fn).expanduser()
+    stat = h5fn.stat()
+    key = str(h5fn.resolve())
+    stamp = (stat.st_size, stat.st_mtime_ns)
+
+    if key in _stores and _stores[key][0] == stamp:
+        return _stores[key][1], _stores[key][2]
+    if key in _stores:
+        _stores.pop(key)[1].close()
+
+    f = h5py.File(h5fn, "r")
+    coords = {
+        "beam_energy_eV": f["beam_energy_eV"][:],
+        "alt_km": f["alt_km"][:],
+        "time": f["time"][:].astype("datetime64[ns]"),
+    }
+    _stores[key] = (stamp, f, coords)
+
+    return f, coords
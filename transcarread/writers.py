@@ -0,0 +1,153 @@
+"""
+write subsets of Transcar output in the original formats, so the smaller files load with
+read_tra() and readexcrates() / ExcitationRates() like the originals.
+
+    write_tra(path, outdir, step=10)
+    write_excrates(kinfn, ofn, tlim=("2013-03-31T09:00", "2013-03-31T09:05"), alt_range=(90, 300))
+
+The selection is any combination of
+sel: a Dataset (or DataArray) from read_tra() / readexcrates() of the same file, e.g. after .sel() / .isel(),
+     whose time and alt_km coordinates are kept
+tlim: (first, last) time kept, inclusive
+alt_range: (lowest, highest) altitude [km] kept, inclusive
+step: keep every step-th of the time steps selected above
+"""
+from pathlib import Path
+import mmap
+from typing import Tuple, Sequence
+import numpy as np
+import xarray
+
+from . import readtraheader, excratesindex, initparams, readexcstream, NumPerRow, NdataCol, d_bytes, blocksize
+from .io import ionorecord, tratimes, headnx
+
+
+def select(
+    times: np.ndarray,
+    alts: np.ndarray,
+    sel: xarray.Dataset = None,
+    tlim: Sequence = None,
+    alt_range: Sequence = None,
+    step: int = 1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    indices of time steps and altitudes kept.
+
+    times: datetime64 of each time step in the file
+    alts: altitude grid [km] of the file
+    """
+    it = np.arange(times.size)
+    ia = np.arange(alts.size)
+
+    if sel is not None:
+        it = it[np.isin(times, sel.time.values.astype(times.dtype))]
+        ia = ia[np.isin(alts, sel.alt_km.values)]
+    if tlim is not None:
+        t = times[it]
+        it = it[(t >= np.datetime64(tlim[0])) & (t <= np.datetime64(tlim[1]))]
+    if alt_range is not None:
+        a = alts[ia]
+        ia = ia[(a >= alt_range[0]) & (a <= alt_range[1])]
+
+    it = it[::step]
+
+    if it.size == 0 or ia.size == 0:
+        raise ValueError("selection is empty")
+
+    return it, ia
+
+
+# %% transcar_output
+def write_tra(
+    path: Path, outdir: Path, sel: xarray.Dataset = None, tlim: Sequence = None, alt_range: Sequence = None, step: int = 1
+) -> Path:
+    """
+    copy the selected records of path/dir.output/transcar_output to outdir/dir.output/transcar_output.
+    All ncol columns of each record are kept, with nx of each header set to the altitudes kept.
+
+    returns: filename written
+    """
+    tcofn = Path(path).expanduser() / "dir.output/transcar_output"
+    ofn = Path(outdir).expanduser() / "dir.output/transcar_output"
+
+    hd = readtraheader(tcofn)
+    n_t = tcofn.stat().st_size // hd["size_record"] // d_bytes
+    rec = np.memmap(tcofn, dtype=ionorecord(hd), mode="r", shape=(n_t,))
+
+    it, ia = select(tratimes(tcofn, hd), rec["data"][0, :, 0], sel, tlim, alt_range, step)
+
+    dtype = ionorecord({**hd, "nx": ia.size})
+    chunk = max(1, blocksize // rec.itemsize)
+
+    ofn.parent.mkdir(parents=True, exist_ok=True)
+    with ofn.open("wb") as f:
+        for i in range(0, it.size, chunk):
+            j = it[i: i + chunk]
+            out = np.empty(j.size, dtype)
+            out["head"] = headnx(rec["head"][j], ia.size)
+            out["data"] = rec["data"][j][:, ia, :]
+            out.tofile(f)
+
+    del rec
+
+    return ofn
+
+
+# %% emissions.dat
+def write_excrates(
+    kinfn: Path, ofn: Path, sel: xarray.Dataset = None, tlim: Sequence = None, alt_range: Sequence = None, step: int = 1
+) -> Path:
+    """
+    write the selected time steps of emissions.dat to ofn.
+    With all altitudes kept, each time step is copied byte for byte.
+    Otherwise the time steps are rewritten with nalt of the header updated, NumPerRow values per line,
+    the excitation and the precipitation blocks each starting on a new line as Transcar writes them.
+
+    returns: filename written
+    """
+    kinfn, nalt, nen, dipangle, ctime, ndatrow, ndat, Nprecip = initparams(kinfn)
+    ofn = Path(ofn).expanduser()
+
+    index = excratesindex(kinfn)
+    alts = readexcstream(kinfn, 0, 1)[0, NumPerRow: NumPerRow + ndat: NdataCol]
+
+    it, ia = select(index["time"], alts, sel, tlim, alt_range, step)
+
+    ofn.parent.mkdir(parents=True, exist_ok=True)
+    with kinfn.open("rb") as fi, mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as mm, ofn.open("wb") as f:
+        if ia.size == nalt:
+            for i in it:
+                f.write(mm[index["start"][i]: index["end"][i]])
+            return ofn
+
+        fmt = excformat(ia.size * NdataCol, Nprecip)
+        chunk = max(1, blocksize // (index["end"][0] - index["start"][0]))
+        for i in range(0, it.size, chunk):
+            j = it[i: i + chunk]
+            dstream = readexcstream(kinfn, j[0], j[-1] + 1)[j - j[0]]
+            for d in dstream:
+                f.write(excheadline(d[:NumPerRow], ia.size).encode("ascii"))
+                data = d[NumPerRow: NumPerRow + ndat].reshape((nalt, NdataCol))[ia]
+                f.write((fmt % tuple(np.concatenate((data.ravel(), d[NumPerRow + ndat:])))).encode("ascii"))
+
+    return ofn
+
+
+def excheadline(h: np.ndarray, nalt: int) -> str:
+    """header line of one emissions.dat time step: YYYYDDD, UTC seconds, dip angle, nalt, nen"""
+    return f"{int(h[0]):12d}{h[1]:19.10f}{h[2]:16.5f}{nalt:16d}{int(h[4]):12d}\n"
+
+
+def excformat(ndat: int, Nprecip: int) -> str:
+    """
+    printf format of the values of one emissions.dat time step after its header line:
+    ndat excitation values, then Nprecip precipitation values from a new line, NumPerRow per line
+    """
+    return "".join(_lines(n) for n in (ndat, Nprecip))
+
+
+def _lines(nval: int) -> str:
+    """printf format of nval values, NumPerRow per line, the last line possibly shorter"""
+    nfull, nlast = divmod(nval, NumPerRow)
+
+    return (" %14.7E" * NumPerRow + "\n") * nfull + " %14.7E" * nlast + "\n" * bool(nlast)